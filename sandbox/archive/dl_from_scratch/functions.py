@@ -122,6 +122,19 @@ class Function:
     test : bool
         whether function is being called in testing; prevents
         caching mostly
+
+    Planned execution
+    -----------------
+    Functions used by a network in planned mode (see NeuralNetwork) are
+    passed an `out` buffer to write their result into, and compute any
+    temporaries in scratch buffers that are only allocated once per
+    input shape. Their cached inputs are then the network's own
+    buffers, so they are cached by reference rather than copied
+
+    Inference
+    ---------
+    Functions called with test=True cache nothing (and make no copies
+    to cache), so they hold no references to their inputs or outputs
     """
     def __init__(self, *args, **kwargs):
         self.name = self.__class__.__name__
@@ -156,6 +169,21 @@ class Function:
         if not self.test:
             self._cache = fvars if len(fvars) > 1 else fvars[0]
 
+    def cache_copy(self, X):
+        """ cache a copy of X, unless testing """
+        if not self.test:
+            self._cache = np.copy(X)
+
+    def scratch(self, key, shape, dtype=np.float32):
+        """ work buffer for planned execution, reallocated only when
+        the requested shape or dtype changes
+        """
+        buffers = self.__dict__.setdefault('_scratch', {})
+        buf = buffers.get(key)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = buffers[key] = np.empty(shape, dtype)
+        return buf
+
     def forward(self, X, *args):
         """ forward serves as an interface to a staticmethod
         for most Functions (ALL functions, currently).
@@ -404,7 +432,7 @@ class Matmul(Function): # #
         return dx, dy
 
     def forward(self, X, Y):
-        self.cache = np.copy(X)
+        self.cache_copy(X)
         Z = self.matmul(X, Y)
         return Z
 
@@ -447,17 +475,28 @@ class Linear(Function): ##
         _,  dB = Bias.bias_prime(x, b)
         return dX, dW, dB
 
-    def forward(self, X, W, B):
-        self.cache = np.copy(X)
-        Z = self.linear(X, W, B)
-        return Z
+    def forward(self, X, W, B, out=None):
+        if out is None:
+            self.cache_copy(X)
+            Z = self.linear(X, W, B)
+            return Z
+        self.cache = X
+        np.matmul(X, W, out=out)
+        out += B
+        return out
 
-    def backward(self, gZ, W, B):
+    def backward(self, gZ, W, B, out=None, gW=None, gB=None):
         X = self.cache
-        dX, dW, dB = self.linear_prime(X, W, B)
-        gX = Matmul.matmul(gZ, dX) # (N, K).(K, D)
-        gW = Matmul.matmul(dW, gZ) # (D, N).(N, K)
-        gB = np.sum(gZ * dB, axis=0)
+        if out is None and gW is None:
+            dX, dW, dB = self.linear_prime(X, W, B)
+            gX = Matmul.matmul(gZ, dX) # (N, K).(K, D)
+            gW = Matmul.matmul(dW, gZ) # (D, N).(N, K)
+            gB = np.sum(gZ * dB, axis=0)
+            return gX, gW, gB
+        # dZ/dB is ones, and the transposes are views
+        gX = np.matmul(gZ, W.T, out=out)
+        gW = np.matmul(X.T, gZ, out=gW)
+        gB = np.sum(gZ, axis=0, out=gB)
         return gX, gW, gB
 
 
@@ -651,15 +690,28 @@ class Sigmoid(Function): # #
         y = Sigmoid.sigmoid(x)
         return y * (1 - y)
 
-    def forward(self, X):
-        self.cache = X
-        Y = self.sigmoid(X)
-        return Y
-
-    def backward(self, gY):
-        X = self.cache
-        gX = gY * self.sigmoid_prime(X)
-        return gX
+    def forward(self, X, out=None):
+        if out is None:
+            self.cache = X
+            Y = self.sigmoid(X)
+            return Y
+        np.negative(X, out=out)
+        np.exp(out, out=out)
+        out += 1
+        np.reciprocal(out, out=out)
+        self.cache = out # Y
+        return out
+
+    def backward(self, gY, out=None):
+        if out is None:
+            X = self.cache
+            gX = gY * self.sigmoid_prime(X)
+            return gX
+        Y = self.cache
+        np.subtract(1, Y, out=out)
+        out *= Y
+        out *= gY
+        return out
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -673,15 +725,25 @@ class Tanh(Function): # #
     def tanh_prime(x):
         return -(np.square(np.tanh(x))) + 1
 
-    def forward(self, X):
-        self.cache = X
-        Y = self.tanh(X)
-        return Y
+    def forward(self, X, out=None):
+        if out is None:
+            self.cache = X
+            Y = self.tanh(X)
+            return Y
+        np.tanh(X, out=out)
+        self.cache = out # Y
+        return out
 
-    def backward(self, gY):
-        X = self.cache
-        gX = gY * self.tanh_prime(X)
-        return gX
+    def backward(self, gY, out=None):
+        if out is None:
+            X = self.cache
+            gX = gY * self.tanh_prime(X)
+            return gX
+        Y = self.cache
+        np.square(Y, out=out)
+        np.subtract(1, out, out=out)
+        out *= gY
+        return out
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -700,15 +762,37 @@ class Softmax(Function): # #
         y = expx / np.sum(expx, **kw)
         return y - np.sum(np.square(y), **kw)
 
-    def forward(self, X):
-        self.cache = np.copy(X)
-        Y = self.softmax(X)
-        return Y
+    @staticmethod
+    def softmax_into(x, out, row_buf):
+        """ softmax of x written to out, with row_buf (N, 1) as scratch """
+        np.max(x, axis=1, keepdims=True, out=row_buf)
+        np.subtract(x, row_buf, out=out)
+        np.exp(out, out=out)
+        np.sum(out, axis=1, keepdims=True, out=row_buf)
+        out /= row_buf
+        return out
+
+    def forward(self, X, out=None):
+        if out is None:
+            self.cache_copy(X)
+            Y = self.softmax(X)
+            return Y
+        self.softmax_into(X, out, self.scratch('row', (len(X), 1), X.dtype))
+        self.cache = out # Y
+        return out
 
-    def backward(self, gY):
-        X = self.cache
-        gX = gY * self.softmax_prime(X)
-        return gX
+    def backward(self, gY, out=None):
+        if out is None:
+            X = self.cache
+            gX = gY * self.softmax_prime(X)
+            return gX
+        Y = self.cache
+        row = self.scratch('row', (len(Y), 1), Y.dtype)
+        np.square(Y, out=out)
+        np.sum(out, axis=1, keepdims=True, out=row)
+        np.subtract(Y, row, out=out)
+        out *= gY
+        return out
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -722,15 +806,24 @@ class Relu(Function): #
     def relu_prime(x):
         return np.where(x < 0, 0, 1)
 
-    def forward(self, X):
-        self.cache = np.copy(X)
-        Y = self.relu(X)
-        return Y
+    def forward(self, X, out=None):
+        if out is None:
+            self.cache_copy(X)
+            Y = self.relu(X)
+            return Y
+        self.cache = X
+        np.maximum(X, 0, out=out)
+        return out
 
-    def backward(self, gY):
+    def backward(self, gY, out=None):
         X = self.cache
-        gX = gY * self.relu_prime(X)
-        return gX
+        if out is None:
+            gX = gY * self.relu_prime(X)
+            return gX
+        mask = self.scratch('mask', X.shape, bool)
+        np.greater_equal(X, 0, out=mask)
+        np.multiply(gY, mask, out=out)
+        return out
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -745,15 +838,27 @@ class SoftPlus(Function): #
         exp_x = np.exp(x)
         return exp_x / (1 + exp_x)
 
-    def forward(self, X):
-        self.cache = np.copy(X)
-        Y = self.softplus(X)
-        return Y
+    def forward(self, X, out=None):
+        if out is None:
+            self.cache_copy(X)
+            Y = self.softplus(X)
+            return Y
+        self.cache = X
+        np.exp(X, out=out)
+        np.log1p(out, out=out)
+        return out
 
-    def backward(self, gY):
+    def backward(self, gY, out=None):
         X = self.cache
-        gX = gY * self.softplus_prime(X)
-        return gX
+        if out is None:
+            gX = gY * self.softplus_prime(X)
+            return gX
+        # softplus' == sigmoid
+        np.negative(X, out=out)
+        np.exp(out, out=out)
+        out += 1
+        np.divide(gY, out, out=out)
+        return out
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -771,15 +876,50 @@ class ELU(Function): #
     def elu_prime(x, alpha):
         return np.where(x < 0, alpha * np.exp(x), 1)
 
-    def forward(self, X):
-        self.cache = np.copy(X)
-        Y = self.elu(X, self.alpha)
-        return Y
+    @staticmethod
+    def elu_into(x, alpha, out, mask):
+        """ elu(x, alpha) written to out; mask is a bool scratch buffer """
+        np.minimum(x, 0, out=out)
+        np.expm1(out, out=out)
+        out *= alpha
+        np.greater(x, 0, out=mask)
+        np.add(out, x, out=out, where=mask) # expm1(0) == 0 where x > 0
+        return out
 
-    def backward(self, gY):
+    @staticmethod
+    def elu_prime_into(x, alpha, out, mask):
+        """ elu_prime(x, alpha) written to out """
+        np.minimum(x, 0, out=out)
+        np.exp(out, out=out)
+        out *= alpha
+        np.greater_equal(x, 0, out=mask)
+        np.copyto(out, 1, where=mask)
+        return out
+
+    def mask_buffer(self, X):
+        """ bool work buffer; only kept across calls when training """
+        if self.test:
+            return np.empty(X.shape, bool)
+        return self.scratch('mask', X.shape, bool)
+
+    def forward(self, X, out=None):
+        if out is None:
+            self.cache_copy(X)
+            Y = self.elu(X, self.alpha)
+            return Y
+        self.cache = X
+        self.elu_into(X, self.alpha, out, self.mask_buffer(X))
+        return out
+
+    def backward(self, gY, out=None):
         X = self.cache
-        gX = gY * self.elu_prime(X, self.alpha)
-        return gX
+        if out is None:
+            gX = gY * self.elu_prime(X, self.alpha)
+            return gX
+        mask = self.scratch('mask', X.shape, bool)
+        self.elu_prime_into(X, self.alpha, out, mask)
+        out *= gY
+        return out
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -814,15 +954,26 @@ class Selu(ELU): #
     def selu_prime(x, alpha, scale):
         return scale * ELU.elu_prime(x, alpha)
 
-    def forward(self, X):
-        self.cache = np.copy(X)
-        Y = self.selu(X, self.alpha, self.scale)
-        return Y
+    def forward(self, X, out=None):
+        if out is None:
+            self.cache_copy(X)
+            Y = self.selu(X, self.alpha, self.scale)
+            return Y
+        self.cache = X
+        self.elu_into(X, self.alpha, out, self.mask_buffer(X))
+        out *= self.scale
+        return out
 
-    def backward(self, gY):
+    def backward(self, gY, out=None):
         X = self.cache
-        gX = gY * self.selu_prime(X, self.alpha, self.scale)
-        return gX
+        if out is None:
+            gX = gY * self.selu_prime(X, self.alpha, self.scale)
+            return gX
+        mask = self.scratch('mask', X.shape, bool)
+        self.elu_prime_into(X, self.alpha, out, mask)
+        out *= self.scale
+        out *= gY
+        return out
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -863,17 +1014,54 @@ class Swish(Function): # #
         db = y * (x - y)
         return dx, db
 
-    def forward(self, X, b):
-        self.cache = np.copy(X)
-        Y = self.swish(X, b)
-        return Y
-
-    def backward(self, gY, B):
-        X = self.cache
-        dX, dB = self.swish_prime(X, B)
-        gX = gY * dX
-        gB = gY * dB
-        return gX, gB.sum(axis=0)
+    def forward(self, X, b, out=None):
+        if out is None:
+            self.cache_copy(X)
+            Y = self.swish(X, b)
+            return Y
+        if self.test:
+            # nothing kept for backprop, so no scratch either
+            np.multiply(X, b, out=out)
+            np.negative(out, out=out)
+            np.exp(out, out=out)
+            out += 1
+            np.divide(X, out, out=out)
+            return out
+
+        # sigmoid(x*b) is kept for backprop
+        sig = self.scratch('sig', X.shape, X.dtype)
+        np.multiply(X, b, out=sig)
+        np.negative(sig, out=sig)
+        np.exp(sig, out=sig)
+        sig += 1
+        np.reciprocal(sig, out=sig)
+        self.cache = X, sig
+        np.multiply(X, sig, out=out)
+        return out
+
+    def backward(self, gY, B, out=None, gB=None):
+        if out is None:
+            X = self.cache
+            dX, dB = self.swish_prime(X, B)
+            gX = gY * dX
+            gB = np.sum(gY * dB, axis=0, out=gB)
+            return gX, gB
+        X, sig = self.cache
+        y = self.scratch('y', X.shape, X.dtype)
+        tmp = self.scratch('tmp', X.shape, X.dtype)
+        np.multiply(X, sig, out=y)
+        # dx = sig + b * y * (1 - sig)
+        np.subtract(1, sig, out=tmp)
+        tmp *= y
+        tmp *= B
+        tmp += sig
+        np.multiply(gY, tmp, out=out)
+        # db = y * (x - y)
+        np.subtract(X, y, out=tmp)
+        tmp *= y
+        tmp *= gY
+        gB = np.sum(tmp, axis=0, out=gB)
+        return out, gB
 
 
 
@@ -890,57 +1078,68 @@ class Swish(Function): # #
 class LogisticCrossEntropy(Function): #
     """ Logistic cross-entropy loss defined on sigmoid activation
 
-    Truth labels are converted to one-hot encoding to reduce
-    the duplicate select and reduction ops in forward and backprop
+    Truth labels are used as indices, rather than one-hot encoded:
+    the loss is computed from the stable softplus of X, which sums
+    the (1 - t) terms of every element, and only the N target logits
+    are gathered by label for the t terms
 
     """
     @staticmethod
     def logistic_cross_entropy(x, t):
-        lhs = -(t * np.log(x))
-        rhs = (1 - t) * np.log(1 - x)
-        return np.mean(lhs - rhs)
+        rows = np.arange(len(t))
+        x_t = x[rows, t]
+        lhs = np.log(x_t) - np.log1p(-x_t)
+        return -(np.sum(np.log1p(-x)) + np.sum(lhs)) / x.size
 
     @staticmethod
     def logistic_cross_entropy_prime(x, t):
-        return (x - t) / x.size
+        gX = x / x.size
+        gX[np.arange(len(t)), t] -= 1 / x.size
+        return gX
 
-    def forward(self, X, t_vec, num_classes):
+    def forward(self, X, t_vec, num_classes, out=None):
         """
         Params
         ------
         X : ndarray.float32, (N, D)
             linear output of network's final layer
-        t_vec : ndarray.int32, (N,) ----> (N, D)
-            truth labels on each sample, converted from a 1D
-            vector of vals within [0, D) to 2D 1-hot (with binary vals)
+        t_vec : ndarray.int32, (N,)
+            truth labels on each sample, with vals within [0, D)
+        out : ndarray.float32, (N, D)
+            buffer for p, for planned execution
 
         Returns
         -------
         Y : float, (1,)
             average cross entropy error over all samples
-        p : ndarray.int32, (N,D)
+        p : ndarray.float32, (N,D)
             Network approximations on class labels (for accuracy metrics)
         """
         # Process inputs
         #----------------------
         # Check dimensional integrity
         assert X.ndim == 2 and t_vec.shape[0] == X.shape[0]
+        t = t_vec.reshape(-1)
+        if out is None:
+            out = np.empty(X.shape, np.result_type(X, np.float32))
 
-        # Convert labels to 1-hot
-        t = to_one_hot(np.copy(t_vec), X.shape[-1]) # (N,D)
+        # Average cross-entropy
+        #----------------------
+        # mean of softplus(X) - t * X, written to out as softplus(X)
+        p = np.logaddexp(0, X, out=out)
+        X_t = X[np.arange(len(t)), t]
+        Y = (np.sum(p) - np.sum(X_t)) / X.size
 
         # Sigmoid activation
         #----------------------
-        p = Sigmoid.sigmoid(np.copy(X))
+        # sigmoid(X) == 1 - exp(-softplus(X))
+        np.negative(p, out=p)
+        np.expm1(p, out=p)
+        np.negative(p, out=p)
         self.cache = p, t
-
-        # Average cross-entropy
-        #----------------------
-        Y = self.logistic_cross_entropy(np.copy(p), t)
         return Y, p
 
-
-    def backward(self, *args):
+    def backward(self, *args, **kwargs):
         """ Initial gradient to be chained through the network
         during backprop
 
@@ -948,8 +1147,10 @@ class LogisticCrossEntropy(Function): #
         ------
         p : ndarray.float32, (N,D)
             sigmoid activation on network forward output
-        t : ndarray.int32, (N,D), 1-hot
+        t : ndarray.int32, (N,)
             ground truth labels for this sample set
+        out : ndarray.float32, (N,D)
+            buffer for gX, for planned execution
 
         Returns
         -------
@@ -963,7 +1164,9 @@ class LogisticCrossEntropy(Function): #
 
         # Get gradient
         #----------------------
-        gX = self.logistic_cross_entropy_prime(p, t)
+        # (p - t) / size, with t only subtracted at the label indices
+        gX = np.divide(p, p.size, out=kwargs.get('out'))
+        gX[np.arange(len(t)), t] -= 1 / p.size
         return gX
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -971,21 +1174,24 @@ class LogisticCrossEntropy(Function): #
 class SoftmaxCrossEntropy(Function): #
     """ Cross entropy loss defined on softmax activation
 
-    Truth labels are converted to one-hot encoding to reduce
-    the duplicate select and reduction ops in forward and backprop
+    Softmax and cross entropy are fused into a stable log-sum-exp:
+    the log-probability of each sample's target is gathered by its
+    label index, so truth labels are never one-hot encoded, and the
+    loss needs O(N) memory beyond the softmax output
 
     """
     @staticmethod
     def softmax_cross_entropy(x, t):
-        tlog_x = -(t * np.log(x))
-        return np.mean(np.sum(tlog_x, axis=1))
+        return -np.mean(np.log(x[np.arange(len(t)), t]))
 
     @staticmethod
     def softmax_cross_entropy_prime(x, t):
-        return (x - t) / x.shape[0]
+        gX = x / x.shape[0]
+        gX[np.arange(len(t)), t] -= 1 / x.shape[0]
+        return gX
 
 
-    def forward(self, X, t_vec, num_classes):
+    def forward(self, X, t_vec, num_classes, out=None):
         """ Cross entropy loss function defined on a
         softmax activation
 
@@ -993,46 +1199,60 @@ class SoftmaxCrossEntropy(Function): #
         ------
         X : ndarray.float32, (N, D)
             output of network's final layer with no activation. *2D assumed*
-        t_vec : ndarray int32, (N,) ----> (N, D)
+        t_vec : ndarray int32, (N,)
             truth labels for each sample, where int values range [0, D)
-            converted to (N, D) one-hot encoding
+        out : ndarray.float32, (N, D)
+            buffer for p, for planned execution
 
         Returns
         -------
         Y : float, (1,)
             average cross entropy error over all samples
-        p : ndarray.int32, (N,D)
+        p : ndarray.float32, (N,D)
             Network approximations on class labels (for accuracy metrics)
         """
         # Preprocess inputs
         #----------------------
         # Check dimensional integrity
         assert X.ndim == 2 and t_vec.shape[0] == X.shape[0]
+        t = t_vec.reshape(-1)
+        if out is None:
+            out = np.empty(X.shape, np.result_type(X, np.float32))
+        N = X.shape[0]
 
-        # Convert labels to 1-hot
-        t = to_one_hot(np.copy(t_vec), X.shape[-1])#num_classes) # (N,D)
-
-        # Softmax activation
+        # Log-sum-exp
         #----------------------
-        p = Softmax.softmax(X)
-        self.cache = p, t
+        # z = X - max(X), written to out
+        row = self.scratch('row', (N, 1), out.dtype)
+        np.max(X, axis=1, keepdims=True, out=row)
+        z = np.subtract(X, row, out=out)
+        z_t = z[np.arange(N), t]
+        np.exp(z, out=out)
+        np.sum(out, axis=1, keepdims=True, out=row)
 
         # Average cross entropy
         #----------------------
-        Y = self.softmax_cross_entropy(np.copy(p), t)
-        #interact(local=dict(globals(), **locals()))
+        # -log p_t == log(sum(exp(z))) - z_t
+        Y = np.mean(np.log(row[:, 0]) - z_t)
+
+        # Softmax activation
+        #----------------------
+        p = np.divide(out, row, out=out)
+        self.cache = p, t
         return Y, p
 
 
-    def backward(self, *args):
+    def backward(self, *args, **kwargs):
         """ Initial backprop gradient grad on X wrt loss
 
         Params
         ------
         p : ndarray.float32, (N,D)
             activation on network forward output
-        t : ndarray.int32, (N,D), 1-hot
+        t : ndarray.int32, (N,)
             ground truth labels for this sample set
+        out : ndarray.float32, (N,D)
+            buffer for gX, for planned execution
 
         Returns
         -------
@@ -1045,7 +1265,10 @@ class SoftmaxCrossEntropy(Function): #
 
         # Calculate grad
         #---------------
-        gX = self.softmax_cross_entropy_prime(p, t)
+        # (p - t) / N, with t only subtracted at the label indices
+        N = p.shape[0]
+        gX = np.divide(p, N, out=kwargs.get('out'))
+        gX[np.arange(N), t] -= 1 / N
         return gX
 
 #------------------------------------------------------------------------------
@@ -1104,19 +1327,31 @@ class Dropout(Function):
     The idea is that network connections, instead of learning features by the
     detection and context of others, the connections are instead encouraged
     to learn more robust detection of features.
+
+    Masks are drawn from rng, a np.random.Generator, as float32 uniforms
+    into a reused buffer, so drawing a mask allocates nothing. By
+    default rng is seeded from the legacy global RNG, so np.random.seed
+    still makes runs reproducible (it is seeded on the first mask, so
+    building a network doesn't shift its initialization)
     """
-    def __init__(self, drop_rate=0.5):
+    def __init__(self, drop_rate=0.5, rng=None):
         """ 50% drop-rate is suggested default """
         self.drop_rate = drop_rate
+        self.rng = rng
         super().__init__()
 
     def get_mask(self, X):
-        if hasattr(self, 'mask'): return self.mask
+        """ draws a new mask for X, into a buffer reused across calls """
+        if self.rng is None:
+            self.rng = np.random.default_rng(np.random.randint(2**31))
         p  = self.drop_rate
-        drops = np.random.rand(*X.shape) >= p
-        scale = 1 / (1 - p)
-        self.mask = (drops * scale).astype(X.dtype)
-        return self.mask
+        u = self.scratch('uniform', X.shape, np.float32)
+        self.rng.random(out=u, dtype=np.float32)
+        mask = self.scratch('mask', X.shape, np.result_type(X, np.float32))
+        np.greater_equal(u, p, out=mask)
+        mask *= 1 / (1 - p)
+        self.mask = mask
+        return mask
 
     @staticmethod
     def dropout(x, mask):
@@ -1126,14 +1361,18 @@ class Dropout(Function):
     def dropout_prime(x, mask):
         return mask
 
-    def forward(self, X):
-        if self.test: return X # don't drop test elements
+    def forward(self, X, out=None):
+        if self.test: return X # don't drop (or mask) test elements
         mask = self.get_mask(X)
+        if out is not None:
+            return np.multiply(X, mask, out=out)
         Y = self.dropout(X, mask)
         return Y
 
-    def backward(self, gY):
+    def backward(self, gY, out=None):
         mask = self.mask
+        if out is not None:
+            return np.multiply(gY, mask, out=out)
         gX = gY * mask
         return gX
 
@@ -12,7 +12,16 @@ Layers also allows their respective functions to remain strictly
 functional, managing the parameters and gradients (and the
 constituent initialization and updating).
 
+# Parameter arena
+A ParameterArena gathers the vars of a set of layers into two flat,
+contiguous float32 buffers, one for the parameters and one for their
+gradients. The layers' vars and gradient buffers become reshaped views
+into the arena, so an optimizer can update every parameter of a model
+with a few ops over one flat array.
+
 """
+import numpy as np
+
 import functions
 from initializers import GlorotNormal, HeNormal, Zeros, Ones
 
@@ -73,6 +82,7 @@ class Layer:
                 init : Initializer to be used
         """
         key_val = '{}_{{}}'.format(self.name)
+        self.var_tags = [layer_var['tag'] for layer_var in layer_vars]
         for layer_var in layer_vars:
             # Unpack var attributes
             #-----------------------------
@@ -91,6 +101,25 @@ class Layer:
             # variable grad placeholder
             setattr(self, '{}_grad'.format(tag), None)
 
+    def grad_buffer(self, tag):
+        """ persistent gradient buffer for a var, written in-place by
+        backprop (the {tag}_grad attribute is still reset to None on update)
+        """
+        buffers = self.__dict__.setdefault('_grad_buffers', {})
+        var = getattr(self, tag)
+        buf = buffers.get(tag)
+        if buf is None or buf.shape != var.shape or buf.dtype != var.dtype:
+            buf = buffers[tag] = np.empty_like(var)
+        return buf
+
+    def bind_var(self, tag, var, grad):
+        """ replace var tag and its gradient buffer with the given arrays
+        (views into a ParameterArena)
+        """
+        np.copyto(var, getattr(self, tag))
+        setattr(self, tag, var)
+        self.__dict__.setdefault('_grad_buffers', {})[tag] = grad
+
 
     # Layer optimization
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -104,9 +133,9 @@ class Layer:
         """
         raise NotImplementedError
 
-    def __call__(self, *args, backprop=False, test=False):
+    def __call__(self, *args, backprop=False, test=False, **kwargs):
         func = self.backward if backprop else self.forward
-        return func(*args, test=False)
+        return func(*args, test=test, **kwargs)
 
 
 #==============================================================================
@@ -165,10 +194,8 @@ class Dense(Layer):
         params[self.W_key] = (self.W, self.W_grad)
         params[self.B_key] = (self.B, self.B_grad)
 
-        # Get updates
-        updated_params = opt(params)
-        self.W = updated_params[self.W_key]
-        self.B = updated_params[self.B_key]
+        # Update in-place (vars may be views into an arena)
+        opt(params)
 
         # Reset grads
         self.W_grad = None
@@ -183,11 +210,13 @@ class Dense(Layer):
         Y = self.linear(X, W, B, **kwargs)
         return Y
 
-    def backward(self, gY, **kwargs):
+    def backward(self, gY, out=None, **kwargs):
         # Grads
         W = self.W
         B = self.B
-        gX, gW, gB = self.linear(gY, W, B, backprop=True)
+        gX, gW, gB = self.linear(gY, W, B, backprop=True, out=out,
+                                 gW=self.grad_buffer('W'),
+                                 gB=self.grad_buffer('B'))
 
         # Assign var grads and chain gX to next layer
         self.W_grad = gW
@@ -223,9 +252,8 @@ class Swish(Layer):
         params = {}
         params[self.B_key] = (self.B, self.B_grad)
 
-        # Get updates
-        updated_params = opt(params)
-        self.B = updated_params[self.B_key]
+        # Update in-place (vars may be views into an arena)
+        opt(params)
         self.B_grad = None
 
     # Layer network ops
@@ -236,16 +264,72 @@ class Swish(Layer):
         Y = self.swish(X, B, **kwargs)
         return Y
 
-    def backward(self, gY, **kwargs):
+    def backward(self, gY, out=None, **kwargs):
         # Grads
         B = self.B
-        gX, gB = self.swish(gY, B, backprop=True)
+        gX, gB = self.swish(gY, B, backprop=True, out=out,
+                            gB=self.grad_buffer('B'))
 
         # Assign var grads and chain gX to next layer
         self.B_grad = gB
         return gX
 
 
+#==============================================================================
+#------------------------------------------------------------------------------
+#                            Parameter arena
+#------------------------------------------------------------------------------
+#==============================================================================
+
+class ParameterArena:
+    """ Flat, contiguous storage for the learnable vars of layers
+
+    Every var of the given layers is copied into one flat float32
+    parameter buffer, and rebound (along with its gradient buffer) as a
+    reshaped view into the arena. Each var starts on a 64-byte boundary;
+    the padding between vars has zero parameters and gradients, so it
+    is left unchanged by updates.
+
+    Attributes
+    ----------
+    key : str
+        parameter key for the whole arena, for optimizer state
+    params : ndarray.float32, (size,)
+        all parameters
+    grads : ndarray.float32, (size,)
+        all gradients, written in-place by the layers' backprop
+    slices : dict(str: slice)
+        var key (eg 'Dense-1_W') ---> its slice of params and grads
+    """
+    key = 'arena'
+    align = 16 # float32 elements, 64 bytes
+
+    def __init__(self, layers, dtype=np.float32):
+        # Lay out vars
+        #------------------------------
+        units = [(layer, tag) for layer in layers for tag in layer.var_tags]
+        self.slices = {}
+        offset = 0
+        for layer, tag in units:
+            size = getattr(layer, tag).size
+            key = getattr(layer, '{}_key'.format(tag))
+            self.slices[key] = slice(offset, offset + size)
+            offset += -(-size // self.align) * self.align
+        self.params = np.zeros(offset, dtype)
+        self.grads  = np.zeros(offset, dtype)
+
+        # Bind layer vars to arena views
+        #------------------------------
+        for layer, tag in units:
+            shape = getattr(layer, tag).shape
+            idx = self.slices[getattr(layer, '{}_key'.format(tag))]
+            layer.bind_var(tag, self.params[idx].reshape(shape),
+                           self.grads[idx].reshape(shape))
+
+    def __len__(self):
+        return len(self.params)
+
+
 #==============================================================================
 
 # Available Layers
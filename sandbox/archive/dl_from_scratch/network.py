@@ -34,7 +34,7 @@ Control Flow
     - If the layer has learnable parameters, such as a Dense layer,
       it will store the gradients for its variables
 5 - An optimizer then updates all learnable variables in the network's
-    layers
+    layers (at once, through the network's flat ParameterArena)
 
 * This process is repeated indefinitely, typically until it has converged
   upon the best local minimum, or whenever the specified number of epochs
@@ -54,6 +54,29 @@ NeuralNetwork : fully-connected, feed-forward network
 
     - Typically shallower than other types of networks (though this
       implementation is of arbitrary depth)
+
+
+Planned execution
+-----------------
+With planned=True, the network allocates an output buffer and a
+gradient buffer for every layer once per batch shape (see
+NeuralNetwork.plan), and its layers and functions write into them
+through their `out` args instead of returning new arrays. Functions
+cache references to these buffers instead of copies, so a training
+step at a steady batch shape does not allocate activations or
+gradients. Outputs returned by a planned network are its own buffers,
+and are overwritten by the next pass.
+
+
+Inference
+---------
+forward(X, test=True) runs in inference mode, planned or not: test is
+propagated to every layer and function, so nothing is cached and
+dropout is skipped, and layers write their outputs alternately into a
+single pair of ping-pong buffers, sized for the network's widest layer
+(see NeuralNetwork.inference). Peak inference memory is then two
+activations, whatever the depth. The returned output is a view into
+the buffer pair, overwritten by the next inference.
 """
 import numpy as np
 import layers as L
@@ -63,7 +86,8 @@ import functions as F
 
 class NeuralNetwork:
     """ Fully-connected, feed-forward neural network """
-    def __init__(self, channels, activation=F.Selu, use_dropout=False):
+    def __init__(self, channels, activation=F.Selu, use_dropout=False,
+                 planned=False):
         """ Initializes an arbitrarily deep neural network
         Params
         ------
@@ -74,10 +98,15 @@ class NeuralNetwork:
             activation function, or layer if parameterized
         use_dropout : bool
             whether to use dropout function
+        planned : bool
+            whether to run on preallocated buffers (see Planned execution)
         """
         self.channels = list(zip(channels, channels[1:])) # tuple (k_in, k_out)
         self.activation  = activation
         self.use_dropout = use_dropout
+        self.planned = planned
+        self.input_buffer = None
+        self.inference_buffers = None
 
         # Initialize layers
         #------------------
@@ -99,14 +128,88 @@ class NeuralNetwork:
                 activation = self.activation(ID, kdims)
                 self.layers.append(activation)
 
+        # Parameter arena
+        #------------------
+        # all learnable vars and grads, as views into two flat buffers
+        self.arena = L.ParameterArena(
+            [unit for unit in self.layers if unit.__module__ == 'layers'])
+
+
+    # Buffer planning
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    def layer_shapes(self, input_shape):
+        """ output shape of every layer, for inputs of input_shape """
+        num_samples = input_shape[0]
+        shape = tuple(input_shape)
+        shapes = []
+        for layer in self.layers:
+            if isinstance(layer, L.Dense):
+                shape = (num_samples, layer.kdims[-1])
+            shapes.append(shape)
+        return shapes
+
+    def plan(self, input_shape):
+        """ Allocates the input, and every layer's output and gradient
+        buffers, for inputs of input_shape
+
+        Params
+        ------
+        input_shape : tuple(int); (N, D)
+            batch shape; forward replans when the batch shape changes
+        """
+        input_shape = tuple(input_shape)
+        output_shapes = self.layer_shapes(input_shape)
+        self.input_buffer = np.empty(input_shape, np.float32)
+        self.output_buffers = [np.empty(shape, np.float32)
+                               for shape in output_shapes]
+        # grad wrt a layer's input has the shape of its input
+        self.grad_buffers = [np.empty(shape, np.float32)
+                             for shape in [input_shape] + output_shapes[:-1]]
 
     # Network algorithm
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     def forward(self, X, test=False):
         """ Propagates input X through network layers """
-        Y = np.copy(X)
-        for layer in self.layers:
-            Y = layer(Y, test=test)
+        if test:
+            return self.inference(X)
+        if not self.planned:
+            Y = np.copy(X)
+            for layer in self.layers:
+                Y = layer(Y, test=test)
+            return Y
+
+        if self.input_buffer is None or self.input_buffer.shape != X.shape:
+            self.plan(X.shape)
+        Y = self.input_buffer
+        np.copyto(Y, X)
+        for layer, out in zip(self.layers, self.output_buffers):
+            Y = layer(Y, test=test, out=out)
+        return Y
+
+    def inference(self, X):
+        """ Propagates input X through network layers, in inference
+        mode, on the ping-pong buffer pair
+
+        Every layer reads from one buffer of the pair (or X, for the
+        first layer) and writes to the other; the pair is reallocated
+        only when a larger batch comes in
+        """
+        shapes = self.layer_shapes(X.shape)
+        size = max(shape[0] * shape[1] for shape in shapes)
+        if (self.inference_buffers is None
+            or self.inference_buffers[0].size < size):
+            self.inference_buffers = (np.empty(size, np.float32),
+                                      np.empty(size, np.float32))
+        Y = X
+        current = None # buffer holding Y
+        for layer, shape in zip(self.layers, shapes):
+            target = 1 if current == 0 else 0
+            out = self.inference_buffers[target][:shape[0] * shape[1]]
+            out = out.reshape(shape)
+            Y_out = layer(Y, test=True, out=out)
+            if Y_out is out: # (test dropout passes Y through)
+                current = target
+            Y = Y_out
         return Y
 
     def backward(self, gY):
@@ -116,16 +219,22 @@ class NeuralNetwork:
         gY : ndarray
             gradient of loss function wrt to network output Y (or Y_hat)
         """
-        gX = np.copy(gY)
-        for layer in reversed(self.layers):
-            gX = layer(gX, backprop=True)
+        if not self.planned:
+            gX = np.copy(gY)
+            for layer in reversed(self.layers):
+                gX = layer(gX, backprop=True)
+            return
+
+        # gY is only read, so it isn't copied
+        gX = gY
+        for layer, out in zip(reversed(self.layers),
+                              reversed(self.grad_buffers)):
+            gX = layer(gX, backprop=True, out=out)
 
     #==== Optimizer update
     def update(self, opt):
-        """ Pass optimizer through parametric units of layers """
-        for unit in self.layers:
-            if unit.__module__ == 'layers':
-                unit.update(opt)
+        """ Update all parametric units of layers, through the arena """
+        opt.update_arena(self.arena)
 
     # Naming formats
     # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
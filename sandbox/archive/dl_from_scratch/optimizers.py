@@ -25,9 +25,22 @@ Adam: Optimizer, Adaptive moment estimation algorithm
     from its previous, decaying, average gradients
     squared v, and and average gradients m
 
+Optimizers update either a dict of parameters (Optimizer.__call__),
+or all of a model's parameters through the flat buffers of its
+layers.ParameterArena (Optimizer.update_arena)
+
+Updates are made in-place: parameters (and Adam's moments, which are
+allocated once per parameter) are updated chunk by chunk with `out=`
+ufuncs into a single scratch buffer, so that every operand of a chunk
+stays in cache, and an update allocates nothing.
+
 """
 import numpy as np
 
+# float32 elements per in-place update chunk; with Adam's five
+# operands (param, grad, m, v, scratch), 160KB per chunk
+_chunk_size = 2**13
+
 #==============================================================================
 # Parameter
 #==============================================================================
@@ -68,10 +81,13 @@ class Optimizer:
         how far we want to move away from the
         gradient. The greater the value, the greater
         the updates to a param.
+    chunk_size : int
+        number of elements updated per chunk of an in-place update
 
     """
-    def __init__(self, lr=0.01, **kwargs):
+    def __init__(self, lr=0.01, chunk_size=_chunk_size, **kwargs):
         self.lr = lr
+        self.chunk_size = chunk_size
         for key, val in kwargs.items():
             setattr(self, key, val)
 
@@ -79,13 +95,39 @@ class Optimizer:
         name = self.__class__.__name__
         return name
 
+    def scratch(self, dtype):
+        """ chunk-sized work buffer, allocated once per dtype """
+        buffers = self.__dict__.setdefault('_scratch', {})
+        if dtype not in buffers:
+            buffers[dtype] = np.empty(self.chunk_size, dtype)
+        return buffers[dtype]
+
+    def chunks(self, *arrays):
+        """ yields matching flat chunks of the (contiguous) arrays,
+        and a scratch buffer of the same length
+        """
+        flat = [a.reshape(-1) for a in arrays]
+        buf = self.scratch(flat[0].dtype)
+        size = self.chunk_size
+        for start in range(0, flat[0].size, size):
+            chunk = [a[start:start+size] for a in flat]
+            yield chunk + [buf[:len(chunk[0])]]
+
+    def next_step(self):
+        """ advance optimizer state by one step; called once before
+        every step's updates
+        """
+        pass
+
     def update(self, P, P_grad, P_key):
-        """ Update parameter P with it's gradient """
+        """ Update parameter P in-place with it's gradient """
         raise NotImplementedError
 
     def __call__(self, params):
         """ Adjust parameters based on gradients from an objective
 
+        All of the params given are updated as a single step
+
         Params
         ------
         params : dict(str: tuple(ndarray, ndarray))
@@ -98,9 +140,10 @@ class Optimizer:
         Returns
         -------
         updated_params : dict(str: ndarray)
-            The updated parameter(s).
+            The updated parameter(s), updated in-place.
             Note: gradients are not returned.
         """
+        self.next_step()
         updated_params = {}
         for param_key, param_vars in params.items():
             # Get parameter variables from tuple pair
@@ -110,6 +153,15 @@ class Optimizer:
             updated_params[param_key] = self.update(P, P_grad, param_key)
         return updated_params
 
+    def update_arena(self, arena):
+        """ Update every parameter in a layers.ParameterArena at once
+
+        The arena's flat parameters are updated in-place as a single
+        parameter, keyed to arena.key, with its flat gradients
+        """
+        self.next_step()
+        self.update(arena.params, arena.grads, arena.key)
+
 #==============================================================================
 # Optimizers
 #==============================================================================
@@ -121,7 +173,11 @@ class SGD(Optimizer):
     variable and it's learning-rate scaled gradient
     """
     def update(self, P, P_grad, *args):
-        return P - self.lr * P_grad
+        lr = float(self.lr)
+        for p, g, buf in self.chunks(P, P_grad):
+            np.multiply(g, lr, out=buf)
+            p -= buf
+        return P
 
 #------------------------------------------------------------------------------
 
@@ -137,12 +193,15 @@ class Adam(Optimizer):
     moments : dict(str : dict(str : ndarray))
         Collection of moment vectors keyed to a param in the model.
         For each parameter, there is a dict with two ndarrays,
-        'm' and 'v', which are the moments for that param
+        'm' and 'v', which are the moments for that param. They are
+        allocated on the param's first update, and updated in-place
 
     t : int
         timestep corresponding to number of updates made
         (ie, number of epochs or iterations completed thus far),
-        used adapting stepsize (learning rate) for each update
+        used adapting stepsize (learning rate) for each update.
+        Advanced once per step (Adam.next_step), however many
+        parameters the step updates
 
     Params
     ------
@@ -157,12 +216,13 @@ class Adam(Optimizer):
 
     """
     def __init__(self, alpha=0.001, beta1=0.9, beta2=0.999, eps=1e-8,
-                 moments_init=None):
+                 moments_init=None, chunk_size=_chunk_size):
         """ suggested default values (by authors) """
         self.alpha = alpha
         self.beta1 = beta1
         self.beta2 = beta2
         self.eps   = eps
+        self.chunk_size = chunk_size
         self.moments = {} # eg, moments['layer2_W1'] = {'m': ndarray, 'v': ndarray}
         self.t = 0 # timestep
 
@@ -172,16 +232,11 @@ class Adam(Optimizer):
 
     def init_moments(self, P, P_key):
         """ initialize Adam moment estimates m, v for param P"""
-        m = np.zeros_like(P).astype(np.float32)
-        v = np.zeros_like(P).astype(np.float32)
-        self.update_moments(P_key, m, v)
+        m = np.zeros_like(P, dtype=np.float32)
+        v = np.zeros_like(P, dtype=np.float32)
+        self.moments[P_key] = {'m': m, 'v': v}
         return self.moments[P_key]
 
-    def update_moments(self, P_key, m, v):
-        """ Update Adam moment estimates m, v """
-        updated_moments = {'m': m, 'v': v}
-        self.moments[P_key] = updated_moments
-
     def get_moments(self, P, P_key):
         """ get moment estimates from collection
         If moments for parameter P do not exist, first initialize
@@ -192,6 +247,10 @@ class Adam(Optimizer):
             moments = self.moments[P_key]
         return moments
 
+    def next_step(self):
+        """ update timestep """
+        self.t += 1
+
     @property
     def step(self):
         """ calculate current stepsize based on bias-corrected
@@ -216,38 +275,47 @@ class Adam(Optimizer):
         # Step at time t
         #---------------
         step = alpha * np.sqrt(b2) / b1
-        return step
+        return float(step)
 
 
     def update(self, P, P_grad, P_key):
-        """ Update parameter P with gradient P_grad """
-
-        # update timestep
-        self.t += 1
+        """ Update parameter P in-place with gradient P_grad """
 
         # Get Adam update params
         #-----------------------
         step  = self.step
-        beta1 = self.beta1
-        beta2 = self.beta2
-        eps = self.eps
+        beta1 = float(self.beta1)
+        beta2 = float(self.beta2)
+        eps = float(self.eps)
 
         # Get moments
         #------------
         P_moments = self.get_moments(P, P_key)
-        m = P_moments['m']
-        v = P_moments['v']
-
-        # Update moments
-        #---------------
-        m = beta1 * m + (1 - beta1) * P_grad
-        v = beta2 * v + (1 - beta2) * np.square(P_grad)
-        self.update_moments(P_key, m, v)
-
-        # Update param P
-        #---------------
-        P_update = P - step * m / (np.sqrt(v) + eps)
-        return P_update
+        M = P_moments['m']
+        V = P_moments['v']
+
+        for p, g, m, v, buf in self.chunks(P, P_grad, M, V):
+            # Update moments
+            #---------------
+            # m = beta1 * m + (1 - beta1) * g
+            np.multiply(g, 1 - beta1, out=buf)
+            m *= beta1
+            m += buf
+            # v = beta2 * v + (1 - beta2) * g**2
+            np.square(g, out=buf)
+            buf *= 1 - beta2
+            v *= beta2
+            v += buf
+
+            # Update param P
+            #---------------
+            # p = p - step * m / (sqrt(v) + eps)
+            np.sqrt(v, out=buf)
+            buf += eps
+            np.divide(m, buf, out=buf)
+            buf *= step
+            p -= buf
+        return P
 
 
 
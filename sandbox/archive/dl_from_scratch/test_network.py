@@ -0,0 +1,67 @@
+""" Allocation tests for planned NeuralNetwork training steps
+
+$ python -m pytest test_network.py
+"""
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import functions as F
+import layers as L
+import optimizers
+from network import NeuralNetwork
+
+
+def planned_step(model, objective, optimizer, x, y, num_classes):
+    y_hat = model.forward(x)
+    objective(y_hat, y, num_classes, out=objective.scratch('p', y_hat.shape))
+    model.backward(objective(backprop=True,
+                             out=objective.scratch('grad', y_hat.shape)))
+    model.update(optimizer)
+
+
+@pytest.mark.parametrize('activation', [F.Selu, L.Swish])
+@pytest.mark.parametrize('use_dropout', [False, True])
+def test_planned_steps_do_not_allocate(activation, use_dropout):
+    np.random.seed(0)
+    num_samples, num_feat, width, num_classes = 128, 32, 512, 10
+    model = NeuralNetwork([num_feat, width, width, num_classes],
+                          activation=activation, use_dropout=use_dropout,
+                          planned=True)
+    objective = F.SoftmaxCrossEntropy()
+    optimizer = optimizers.Adam()
+    x = np.random.randn(num_samples, num_feat).astype(np.float32)
+    y = np.random.randint(0, num_classes, num_samples)
+
+    # first step plans the buffers and optimizer state
+    planned_step(model, objective, optimizer, x, y, num_classes)
+
+    activation_bytes = num_samples * width * 4
+    tracemalloc.start()
+    try:
+        # per-step objects (cached views, loss) live from step to step,
+        # and settle after a couple of traced steps
+        for _ in range(2):
+            planned_step(model, objective, optimizer, x, y, num_classes)
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in range(5):
+            planned_step(model, objective, optimizer, x, y, num_classes)
+        end, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # only small O(N) temporaries (label indices, reduction buffers)
+    assert end - start < 4096
+    assert peak - start < activation_bytes // 4
+
+
+def test_dropout_masks_are_redrawn():
+    dropout = F.Dropout(0.5, rng=np.random.default_rng(0))
+    X = np.ones((8, 16), np.float32)
+    first = np.copy(dropout(X))
+    second = np.copy(dropout(X))
+    assert not np.array_equal(first, second)
+    assert set(np.unique(first)) <= {0, 2}
+    assert dropout(X, test=True) is X
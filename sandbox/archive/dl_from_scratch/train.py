@@ -38,7 +38,7 @@ num_test = dataset.x_test.shape[0]
 # Initialize model
 # ================
 np.random.seed(args.rand)
-model = NeuralNetwork(channels, activation=activation)
+model = NeuralNetwork(channels, activation=activation, planned=True)
 optimizer = optimizers.Adam(alpha=learn_rate)
 objective = F.SoftmaxCrossEntropy()
 #objective = F.LogisticCrossEntropy()
@@ -56,14 +56,16 @@ for step in range(num_iters):
 
     # forward pass
     y_hat = model.forward(x)
-    error, class_scores = objective(y_hat, y, num_classes)
+    error, class_scores = objective(y_hat, y, num_classes,
+                                   out=objective.scratch('p', y_hat.shape))
     accuracy = utils.classification_accuracy(class_scores, y)
     training_error[step] = [error, accuracy]
     pred = np.argmax(class_scores, 1)
     #print(f'{step:>5}: {pred} | {y}')
 
     # backprop and update
-    grad_loss = objective(backprop=True)
+    grad_loss = objective(backprop=True,
+                          out=objective.scratch('grad', y_hat.shape))
     model.backward(grad_loss)
     model.update(optimizer)
 
@@ -96,7 +98,7 @@ for i in range(num_test):
 
 xtest, ytest = dataset.x_test, dataset.y_test
 y_hat = model.forward(xtest, test=True)
-error, class_scores = objective(y_hat, ytest, num_classes)
+error, class_scores = objective(y_hat, ytest, num_classes, test=True)
 accuracy = utils.classification_accuracy(class_scores, ytest)
 test_error[:] = [error, accuracy]
 pred = np.argmax(class_scores, 1)
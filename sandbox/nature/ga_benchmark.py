@@ -0,0 +1,272 @@
+""" Benchmarks for the genetic algorithm hot paths
+
+Times the GA operators over a grid of population size, tournament
+size, feature count and class count, on synthetic data (so no dataset
+is needed), and writes the results of each run to a JSON file.
+
+Usage
+-----
+# run the default grid
+$ python ga_benchmark.py run -o results.json
+
+# smaller grid
+$ python ga_benchmark.py run -p 64 256 -t 8 -f 16 -k 3 -o results.json
+
+# flag anything more than 10% slower in new.json than in base.json
+$ python ga_benchmark.py compare base.json new.json --threshold 0.1
+
+Benchmarks
+----------
+selection, reproduce, mutate, fitness :
+    a single call of the per-genome operator
+population_fitness, evolve_generation :
+    a single call of the batched operator, for the whole population
+select_<strategy> :
+    one generation's parents, for each selection strategy
+evaluate_population :
+    population vote on the synthetic test set
+genetic_algorithm :
+    a full run of a few generations
+"""
+import io
+import sys
+import json
+import time
+import platform
+import argparse
+import functools
+import itertools
+import contextlib
+
+import numpy as np
+
+import genetic_algorithm as ga
+
+
+#-----------------------------------------------------------------------------#
+#                                   Config                                    #
+#-----------------------------------------------------------------------------#
+
+_seed = 123
+_repeat = 5           # timed repetitions per benchmark, best taken
+_num_samples = 2048   # synthetic dataset size
+_num_generations = 10 # generations per full genetic_algorithm run
+_threshold = 0.1      # relative slowdown flagged as regression
+
+# grid
+_population_sizes = [128, 1024]
+_tournament_sizes = [8, 36]
+_feature_counts = [4, 64]
+_class_counts = [3, 10]
+
+
+#-----------------------------------------------------------------------------#
+#                                Synthetic data                               #
+#-----------------------------------------------------------------------------#
+
+class SyntheticDataset:
+    """ Linearly separable classification data, with the dataset
+    interface the GA uses (X, target_names, get_batch and the
+    train/validation/test splits)
+    """
+    def __init__(self, num_samples, num_feat, num_class, seed=_seed):
+        rng = np.random.RandomState(seed)
+        W = rng.randn(num_feat, num_class)
+        self.X = rng.randn(num_samples, num_feat).astype(np.float32)
+        self.Y = np.argmax(self.X @ W, axis=-1).astype(np.int32)
+        self.target_names = [str(k) for k in range(num_class)]
+
+        # 80/10/10 split
+        n_val = n_test = num_samples // 10
+        n_train = num_samples - n_val - n_test
+        self.x_train, self.y_train = self.X[:n_train], self.Y[:n_train]
+        self.x_validation = self.X[n_train:n_train + n_val]
+        self.y_validation = self.Y[n_train:n_train + n_val]
+        self.x_test = self.X[n_train + n_val:]
+        self.y_test = self.Y[n_train + n_val:]
+        self.rng = np.random.default_rng(seed)
+
+    def get_batch(self, batch_size):
+        idx = self.rng.integers(0, len(self.y_train), batch_size)
+        return self.x_train[idx], self.y_train[idx]
+
+
+#-----------------------------------------------------------------------------#
+#                                  Benchmarks                                 #
+#-----------------------------------------------------------------------------#
+
+def timeit(fn, repeat=_repeat):
+    """ best and median wall time of fn() over repeat calls """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times), float(np.median(times))
+
+
+def benchmarks(pop_size, tourney_size, num_feat, num_class,
+               num_gens=_num_generations, batch_size=ga._batch_size,
+               seed=_seed):
+    """ benchmark name ---> zero-arg callable, for one grid point """
+    dataset = SyntheticDataset(_num_samples, num_feat, num_class, seed)
+    gene_size = (num_feat, num_class)
+    population = ga.init_population(gene_size, pop_size, seed)
+    next_generation = np.empty_like(population)
+    children = np.empty((2,) + gene_size, np.float32)
+    x, y = dataset.get_batch(batch_size)
+    scores = ga.population_fitness(x, y, population)
+    rate = ga._mutation_rate
+
+    def evaluate_population():
+        with contextlib.redirect_stdout(io.StringIO()):
+            ga.evaluate_population(dataset, population, test=True)
+
+    benches = {
+      'selection': lambda: ga.selection(population, scores, tourney_size),
+      'reproduce': lambda: ga.reproduce(population[0], population[1],
+                                        out=children),
+      'mutate':    lambda: ga.mutate(children[0], rate, out=children[0]),
+      'fitness':   lambda: ga.fitness(x, y, population[0]),
+      'population_fitness': lambda: ga.population_fitness(x, y, population),
+      'evolve_generation':  lambda: ga.evolve_generation(population, scores,
+                                    tourney_size, rate, out=next_generation),
+      'evaluate_population': evaluate_population,
+      'genetic_algorithm': lambda: ga.genetic_algorithm(dataset, num_gens,
+                                    pop_size, tourney_size, rate, batch_size),
+    }
+    for name in ga.SELECTIONS:
+        params = {'tournament_size': tourney_size} if name == 'tournament' else {}
+        select = ga.selection_operator(name, **params)
+        benches['select_' + name] = functools.partial(select, scores, pop_size)
+    return benches
+
+
+def run(population_sizes=_population_sizes, tournament_sizes=_tournament_sizes,
+        feature_counts=_feature_counts, class_counts=_class_counts,
+        repeat=_repeat, seed=_seed, only=None):
+    """ Run every benchmark over the grid
+
+    Returns
+    -------
+    results : list(dict)
+        one record per (benchmark, grid point), with keys
+        'name', 'params', 'best' and 'median' (seconds)
+    """
+    results = []
+    grid = itertools.product(population_sizes, tournament_sizes,
+                             feature_counts, class_counts)
+    for P, T, D, K in grid:
+        if T > P:
+            continue
+        params = {'pop_size': P, 'tourney_size': T,
+                  'num_feat': D, 'num_class': K}
+        for name, fn in benchmarks(P, T, D, K, seed=seed).items():
+            if only and name not in only:
+                continue
+            best, median = timeit(fn, repeat)
+            results.append({'name': name, 'params': params,
+                            'best': best, 'median': median})
+            print('{:<20} P={:<6} T={:<4} D={:<5} K={:<4} {:>12.6f}s'.format(
+                  name, P, T, D, K, best))
+    return results
+
+
+def save_results(path, results):
+    report = {'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': platform.python_version(),
+                       'numpy': np.__version__,
+                       'machine': platform.machine(),
+                       'processor': platform.processor()},
+              'results': results}
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(base, new, threshold=_threshold):
+    """ Compare two lists of results by their best times
+
+    Returns
+    -------
+    regressions : list(tuple(dict, dict))
+        (base, new) record pairs where new is slower than base by
+        more than threshold (a fraction of the base time)
+    """
+    key = lambda r: (r['name'], tuple(sorted(r['params'].items())))
+    base = {key(r): r for r in base}
+    regressions = []
+    for r in new:
+        b = base.get(key(r))
+        if b is None:
+            continue
+        ratio = r['best'] / b['best']
+        flag = 'REGRESSION' if ratio > 1 + threshold else ''
+        p = r['params']
+        print('{:<20} P={:<6} T={:<4} D={:<5} K={:<4} {:>8.3f}x {}'.format(
+              r['name'], p['pop_size'], p['tourney_size'], p['num_feat'],
+              p['num_class'], ratio, flag))
+        if flag:
+            regressions.append((b, r))
+    return regressions
+
+
+#-----------------------------------------------------------------------------#
+#                                     CLI                                     #
+#-----------------------------------------------------------------------------#
+
+cli = argparse.ArgumentParser(description=__doc__,
+                              formatter_class=argparse.RawTextHelpFormatter)
+subparsers = cli.add_subparsers(dest='subcmd')
+
+# run
+# ===
+run_cli = subparsers.add_parser('run', help='run benchmark grid')
+run_cli.add_argument('-o', '--output', type=str, default='ga_benchmark.json',
+    help='path to write JSON results')
+run_cli.add_argument('-p', '--population_sizes', type=int, nargs='+',
+    default=_population_sizes, metavar='P')
+run_cli.add_argument('-t', '--tournament_sizes', type=int, nargs='+',
+    default=_tournament_sizes, metavar='T')
+run_cli.add_argument('-f', '--feature_counts', type=int, nargs='+',
+    default=_feature_counts, metavar='D')
+run_cli.add_argument('-k', '--class_counts', type=int, nargs='+',
+    default=_class_counts, metavar='K')
+run_cli.add_argument('-r', '--repeat', type=int, default=_repeat,
+    help='timed repetitions per benchmark')
+run_cli.add_argument('-b', '--benchmarks', type=str, nargs='+', default=None,
+    help='only run these benchmarks')
+
+# compare
+# =======
+compare_cli = subparsers.add_parser('compare',
+    help='flag regressions between two result files')
+compare_cli.add_argument('base', type=str, help='baseline results')
+compare_cli.add_argument('new', type=str, help='new results')
+compare_cli.add_argument('--threshold', type=float, default=_threshold,
+    help='relative slowdown flagged as a regression')
+
+
+def main():
+    args = cli.parse_args()
+    if args.subcmd == 'run':
+        results = run(args.population_sizes, args.tournament_sizes,
+                      args.feature_counts, args.class_counts, args.repeat,
+                      only=args.benchmarks)
+        save_results(args.output, results)
+        return 0
+    elif args.subcmd == 'compare':
+        base = load_results(args.base)
+        new = load_results(args.new)
+        regressions = compare(base, new, args.threshold)
+        print('{} regression(s)'.format(len(regressions)))
+        return 1 if regressions else 0
+    cli.print_help()
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main())
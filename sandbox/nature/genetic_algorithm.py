@@ -23,18 +23,31 @@ The process of evolution for this GA is as follows:
 import os
 import sys
 import code
+import time
+import json
+import hashlib
+import functools
+import argparse
 import traceback
+from collections import OrderedDict
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor,
+                                FIRST_COMPLETED, wait)
+from multiprocessing import Pool, shared_memory
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
-from scipy import stats
 
 # rel path to utils for dataset
 fpath = os.path.abspath(os.path.dirname(__file__))
 sys.path.append('/'.join(fpath.split('/')[:-1]))
-import utilities as utils
+try:
+    import utilities as utils
+except ImportError:
+    utils = None
 
-raise FileNotFoundError, 'dataset stuff was removed from this project, just use sklearn'
-datasets = utils.DATASETS
+# dataset stuff was removed from this project, just use sklearn;
+# only main() needs them, so the GA itself stays importable without
+datasets = getattr(utils, 'DATASETS', {})
 
 
 #-----------------------------------------------------------------------------#
@@ -45,6 +58,7 @@ datasets = utils.DATASETS
 # =========
 # sess vars
 _seed  = 123
+_bit_generator = 'pcg64'
 _dname = 'iris'
 _num_test = 24
 _batch_size = 4
@@ -52,16 +66,37 @@ _batch_size = 4
 # ga spec
 _population_size = 128
 _tournament_size = 36
+_selection = 'tournament'
 _mutation_rate   = 0.1
 _num_generations = 200
+_genome_dtype = 'float32'
+
+# fitness memo
+_fitness_cache_size = 2**16 # max cached (batch, genome) scores
+
+# population voting
+_sample_chunk = 4096 # samples per voting block
+_genome_chunk = 64   # genomes per voting block
+
+# mutation
+_mutation_chunk = 2**16 # mutation sites drawn per block
+
+# island model
+_num_islands = 1
+_migration_interval = 10
+_num_migrants = 2
+_topology = 'ring'
+
+# checkpoints
+_checkpoint_interval = 10
 
 
 # Arg parser
 # ==========
-cli = utils.CLI
+cli = utils.CLI if utils is not None else argparse.ArgumentParser()
 
 cli.add_argument('-d', '--dataset', type=str, default=_dname,
-    choices=list(datasets.keys()), help='dataset for model')
+    choices=list(datasets.keys()) or None, help='dataset for model')
 
 cli.add_argument('-p', '--population_size', type=int, default=_population_size,
     metavar='P', help='number of genomes in population')
@@ -69,24 +104,94 @@ cli.add_argument('-p', '--population_size', type=int, default=_population_size,
 cli.add_argument('-t', '--tournament_size', type=int, default=_tournament_size,
     metavar='T', help='number of genomes per tournament')
 
+cli.add_argument('--selection', type=str, default=_selection,
+    choices=['tournament', 'rank', 'truncation', 'roulette', 'sus'],
+    help='parent selection strategy')
+
+cli.add_argument('--share_sigma', type=float, default=None, metavar='SIGMA',
+    help='fitness sharing niche radius (no sharing by default)')
+
+cli.add_argument('--share_sample', type=int, default=None, metavar='S',
+    help='estimate niche counts from S sampled genomes')
+
 cli.add_argument('-m', '--mutation_rate', type=float, default=_mutation_rate,
     metavar='M', help='probability a genome has some params re-initialized')
 
 cli.add_argument('-g', '--num_generations', type=int, default=_num_generations,
     metavar='G', help='number of generations over which the population will evolve')
 
+cli.add_argument('--genome_dtype', type=str, default=_genome_dtype,
+    choices=['float32', 'float16', 'int8'],
+    help='storage dtype for genomes; fitness is always computed in float32')
+
 cli.add_argument('-r', '--rng_seed', type=int, default=_seed, metavar='R',
     help='random seed for initialization of population')
 
+cli.add_argument('--bit_generator', type=str, default=_bit_generator,
+    choices=['pcg64', 'philox'], help='bit generator for the GA random streams')
+
 cli.add_argument('-n', '--num_test', type=int, default=_num_test, metavar='N',
     help='number of test samples')
 
+cli.add_argument('-i', '--islands', type=int, default=_num_islands, metavar='I',
+    help='number of sub-populations evolved in parallel processes')
+
+cli.add_argument('--migration-interval', type=int, default=_migration_interval,
+    metavar='M', help='generations between migrations across islands')
+
+cli.add_argument('-c', '--checkpoint', type=str, default=None, metavar='DIR',
+    help='checkpoint directory; resumes from it if it holds a checkpoint')
+
+cli.add_argument('--checkpoint_interval', type=int, default=None, metavar='C',
+    help='generations between checkpoints (default: {})'.format(
+         _checkpoint_interval))
+
+
+#-----------------------------------------------------------------------------#
+#                                Random streams                               #
+#-----------------------------------------------------------------------------#
+""" All GA randomness is drawn from np.random.Generator streams.
+
+Every operator takes an `rng`, and runs derive their streams from a
+SeedSequence: a run seeded with an int gets one stream, while parallel
+members of a run (islands, workers, sweep configs) each get an
+independent child stream spawned from the run's SeedSequence. Runs
+are then bit-reproducible no matter how work lands on processes.
+
+Operators called without an rng draw from a module-level stream.
+"""
+
+BIT_GENERATORS = {'pcg64': np.random.PCG64, 'philox': np.random.Philox}
+
+def make_rng(seed=None, bit_generator=_bit_generator):
+    """ Generator from an int seed or SeedSequence (Generators pass through)
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return np.random.Generator(BIT_GENERATORS[bit_generator](seed))
+
+
+def spawn_rngs(seed, num_streams, bit_generator=_bit_generator):
+    """ independent child Generators of seed, one per parallel member """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [make_rng(child, bit_generator) for child in seed.spawn(num_streams)]
+
+
+_rng = make_rng(_seed)
+
+def get_rng(rng=None):
+    """ rng, or the module-level stream if None """
+    return _rng if rng is None else rng
+
 
 #-----------------------------------------------------------------------------#
 #                               initialization                                #
 #-----------------------------------------------------------------------------#
 
-def init_genome(shape, init=utils.glorot_uniform):
+def init_genome(shape, init=None, rng=None):
     """ interface to initialization func specified by `init` kwarg
 
     genomes are functionally similar to a weight var in a network layer
@@ -97,16 +202,93 @@ def init_genome(shape, init=utils.glorot_uniform):
     shape : tuple(int, int)
         shape should correspond exactly to (num_features, num_classes)
     init : function
-        initializer function, from utilities
+        initializer function, eg from utilities. By default, genes are
+        drawn glorot uniform from rng
+    rng : np.random.Generator
+        random stream
     """
-    return init(shape)
+    if init is not None:
+        return init(shape)
+    return sample_genes(shape, shape, rng=rng)
 
 
-def init_population(shape, population_size, seed=_seed):
-    """ initialize population of genomes """
-    np.random.seed(seed)
-    population = [init_genome(shape) for _ in range(population_size)]
-    return population
+# Genome storage
+# ==============
+""" Genomes can be stored as float32, float16 or int8.
+
+int8 genes are quantized to the glorot_uniform bound m of the genome
+shape, with a step (scale) of m / 127. Every gene the GA produces, by
+initialization or mutation, is drawn from [-m, m), and crossover only
+exchanges existing genes, so one scale covers all genomes exactly. That
+is what lets the operators work natively on the int8 codes: genes from
+different genomes are directly interchangeable, and since the scale is
+positive it does not change any argmax, so fitness needs no rescaling.
+
+Fitness is always accumulated in float32 (see population_logits).
+"""
+
+def genome_scale(shape, dtype):
+    """ value of one step of a genome stored as dtype (1 for floats) """
+    if np.dtype(dtype).kind == 'i':
+        m = np.sqrt(6 / sum(shape)) # glorot_uniform bound
+        return m / np.iinfo(dtype).max
+    return 1.0
+
+
+def quantize(genes, shape, dtype):
+    """ float genes of a genome of shape, in storage dtype """
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'i':
+        info = np.iinfo(dtype)
+        genes = np.rint(genes / genome_scale(shape, dtype))
+        return np.clip(genes, -info.max, info.max).astype(dtype)
+    return genes.astype(dtype, copy=False)
+
+
+def dequantize(population):
+    """ float32 gene values of genomes in any storage dtype """
+    if population.dtype == np.float32:
+        return population
+    scale = genome_scale(population.shape[-2:], population.dtype)
+    genes = population.astype(np.float32)
+    if scale != 1.0:
+        genes *= scale
+    return genes
+
+
+def sample_genes(shape, size, dtype=np.float32, rng=None):
+    """ draw `size` genes from the same distribution init_genome uses
+    for a genome of `shape`, in a single bulk draw
+
+    Bulk operators need this, since calling the initializer on a
+    batched shape would scale by the wrong fan_in + fan_out
+    """
+    m = np.float32(np.sqrt(6 / sum(shape))) # glorot_uniform bound
+    genes = get_rng(rng).random(size, dtype=np.float32)
+    genes *= 2 * m
+    genes -= m  # [0, 1) ---> [-m, m)
+    return quantize(genes, shape, dtype)
+
+
+def init_population(shape, population_size, seed=_seed,
+                    dtype=_genome_dtype, rng=None):
+    """ initialize population of genomes
+
+    The population is kept as a single contiguous array of
+    shape (population_size, *shape), rather than a list of genomes,
+    so that all GA operators can work on it through indexing and views.
+    All genes are drawn in one bulk draw, from rng if given, else
+    from a new stream seeded by seed
+
+    Returns
+    -------
+    population : ndarray; (P, D, K)
+        P genomes, each of shape (D, K), stored as dtype
+    """
+    if rng is None:
+        rng = make_rng(seed)
+    shape = tuple(shape)
+    return sample_genes(shape, (population_size,) + shape, dtype, rng)
 
 
 #-----------------------------------------------------------------------------#
@@ -120,12 +302,14 @@ def predict(x, g):
     yhat = np.argmax(h, axis=-1)
     return yhat
 
-def fitness(x, y, g):
+def fitness(x, y, g, cache=None):
     """ Genetic fitness function (objective function for GAs)
 
     Evaluates how well adapted a genome is to its env by simply
     measuring predictive accuracy
 
+    If a FitnessCache is given, it is consulted before predicting
+
     Params
     ------
     x : ndarray.float16, (N, D)
@@ -134,52 +318,114 @@ def fitness(x, y, g):
         ground truth labels for input x
     g : ndarray.float16, (3, D)
         'genome' represention
+    cache : FitnessCache
+        optional memo of previously computed scores
 
     Returns
     -------
     score : int
         number of correct class predictions made by genome
     """
+    if cache is not None:
+        return cache.fitness(x, y, g)
     yhat = predict(x, g)
     score = (y == yhat).sum()
     return score
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-def selection(x, y, population, tournament_size=_tournament_size):
-    """ Tournament style selection routine
+def population_logits(x, population, out=None):
+    """ class scores of every genome on x, in a single batched matmul
 
-    A fixed number of genomes are selected from the population at random
-    and the fittest genome from that selection goes on to reproduce.
+    Always accumulated in float32. Compact (float16, int8) populations
+    are cast a block of genomes at a time, so no float32 copy of the
+    whole population is made. int8 logits are in units of the
+    population's genome_scale
+
+    Returns
+    -------
+    h : ndarray.float32; (P, N, K)
+        h[p] == x.population[p]
+    """
+    x = np.asarray(x, np.float32)
+    if population.dtype == np.float32:
+        return np.matmul(x, population, out=out) # (N, D).(P, D, K) ---> (P, N, K)
+
+    P, D, K = population.shape
+    if out is None:
+        out = np.empty((P, len(x), K), np.float32)
+    for genomes in _chunks(P, _genome_chunk):
+        g = population[genomes].astype(np.float32)
+        np.matmul(x, g, out=out[genomes])
+    return out
+
+
+def logits_fitness(h, y, out=None):
+    """ fitness of each genome from its (P, N, K) logits on a batch """
+    yhat = np.argmax(h, axis=-1)  # (P, N)
+    return np.sum(yhat == y, axis=-1, out=out)
+
+
+def population_fitness(x, y, population, out=None):
+    """ Batched fitness of every genome in population
+
+    Scores the whole population against x in a single batched matmul,
+    instead of calling fitness once per genome
 
     Params
     ------
     x : ndarray.float32; (N, D)
-        input data
-
+        input features
     y : ndarray.int32; (N,)
-        class labels
+        ground truth labels for input x
+    population : ndarray; (P, D, K)
+        population of genomes
+    out : ndarray.int64; (P,)
+        optional buffer for the scores
+
+    Returns
+    -------
+    scores : ndarray.int64; (P,)
+        number of correct class predictions made by each genome
+    """
+    return logits_fitness(population_logits(x, population), y, out=out)
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-    population : list(ndarray)
+def selection(population, scores, tournament_size=_tournament_size, rng=None):
+    """ Tournament style selection routine
+
+    A fixed number of genomes are selected from the population at random
+    and the fittest genome from that selection goes on to reproduce.
+
+    Fitness is not evaluated here; the winner is read from scores,
+    the population's fitness for the current generation, which
+    is computed once by population_fitness
+
+    Params
+    ------
+    population : ndarray; (P, D, K)
         population of genomes
 
+    scores : ndarray; (P,)
+        fitness of each genome in population
+
     tournament_size : int
         how many genomes in tournament
 
+    rng : np.random.Generator
+        random stream
+
     Returns
     -------
-    fittest : ndarray
-        fittest genome from tournament
+    fittest : ndarray; (D, K)
+        fittest genome from tournament (a view into population)
     """
     # Select genomes randomly from pop
-    idx = np.random.choice(len(population), tournament_size, replace=False)
-    #####################################################################################################################################
-    # FIX THIS. Keep pop in array or something, this is smelly
-    tournament = list(np.array(population)[idx])
-
-    # Evaluate fitness
-    fitnesses = [fitness(x,y,g) for g in tournament]
-    fittest = tournament[np.argmax(fitnesses)]
+    idx = get_rng(rng).choice(len(population), tournament_size, replace=False)
+
+    # Winner from cached fitness
+    fittest = population[idx[np.argmax(scores[idx])]]
     return fittest
 
 
@@ -187,36 +433,1111 @@ def selection(x, y, population, tournament_size=_tournament_size):
 #                            Crossover                                        #
 #-----------------------------------------------------------------------------#
 
-def reproduce(p1, p2):
+def reproduce(p1, p2, out=None, rng=None):
     """ Crossover routine for two genomes
 
     Instead of more typical single-point transfer, a masking
     array is used to select multi-point transfer from
     parent genomes to child genomes
+
+    Params
+    ------
+    p1, p2 : ndarray; (D, K)
+        parent genomes
+    out : ndarray; (2, D, K)
+        optional buffer the two children are written into,
+        eg, a slice of the next generation's population array.
+        Must not overlap with the parents
+    rng : np.random.Generator
+        random stream
+
+    Returns
+    -------
+    c1, c2 : ndarray; (D, K)
+        offspring, as views into out
     """
     # Crossover points
-    gene_mask = np.random.randint(0, 2, p1.shape, dtype=np.bool)
+    gene_mask = get_rng(rng).integers(0, 2, p1.shape, dtype=bool)
 
     # Offspring from parent genomes
-    c1 = np.where(gene_mask, p1, p2)
-    c2 = np.where(gene_mask, p2, p1)
-    return c1.astype(p1.dtype), c2.astype(p1.dtype)  # NECESSARY?  ##########################################
+    if out is None:
+        out = np.empty((2,) + p1.shape, p1.dtype)
+    c1, c2 = out
+    np.copyto(c1, p2)
+    np.copyto(c1, p1, where=gene_mask)
+    np.copyto(c2, p1)
+    np.copyto(c2, p2, where=gene_mask)
+    return c1, c2
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-def mutate(g, mutation_rate):
-    """ Mutation defined here as randomly resampling part of the genome """
-    mutation = init_genome(g.shape)
-    mutated_genes = np.random.rand(*g.shape) < mutation_rate
-    g = np.where(mutated_genes, mutation, g)
-    return g
+def mutate(g, mutation_rate, out=None, rng=None):
+    """ Mutation defined here as randomly resampling part of the genome
+
+    If out is g, the genome is mutated in-place
+    """
+    rng = get_rng(rng)
+    mutation = sample_genes(g.shape, g.shape, g.dtype, rng)
+    mutated_genes = rng.random(g.shape, dtype=np.float32) < mutation_rate
+    if out is None:
+        out = np.copy(g)
+    elif out is not g:
+        np.copyto(out, g)
+    np.copyto(out, mutation, where=mutated_genes)
+    return out
+
+#-----------------------------------------------------------------------------#
+#                             Selection strategies                            #
+#-----------------------------------------------------------------------------#
+""" Parent selection for a whole generation in one vectorized call
+
+Every strategy takes the fitness vector of a generation and returns the
+population indices of num_parents parents, drawn independently:
+
+    parents = strategy(scores, num_parents, ..., rng=rng)
+
+None of them loop over parents, and none draw more than O(num_parents)
+random numbers, so they stay cheap for populations of 10^5 and more.
+Each is a distribution over ranks or scores, sampled by inverse CDF
+
+    tournament : fittest of tournament_size distinct random genomes;
+                 pressure grows with tournament_size
+    rank       : linear ranking; pressure in [1, 2] is the expected
+                 number of offspring of the fittest genome
+    truncation : uniform over the fittest fraction of the population
+    roulette   : fitness proportionate
+    sus        : fitness proportionate, by stochastic universal sampling
+                 (lowest variance in each genome's number of offspring)
+"""
+
+def _sample_cdf(weights, num_samples, rng=None, universal=False):
+    """ indices drawn with probability proportional to weights
+
+    universal draws evenly spaced samples from a single random offset
+    (stochastic universal sampling), so indices come out sorted
+    """
+    rng = get_rng(rng)
+    cdf = np.cumsum(weights, dtype=np.float64)
+    if universal:
+        u = (rng.random() + np.arange(num_samples)) / num_samples
+    else:
+        u = rng.random(num_samples)
+    idx = np.searchsorted(cdf, u * cdf[-1], side='right')
+    return np.minimum(idx, len(cdf) - 1)
+
+
+def _sample_ranked(scores, weights, num_samples, rng=None):
+    """ indices drawn with probability proportional to the weight of
+    their rank (weights[0] for the fittest)
+
+    Ties are broken uniformly at random, independently for every sample:
+    a rank is drawn, then a genome uniformly from the genomes tied at
+    that rank, so tied genomes share the mean weight of their ranks
+    """
+    rng = get_rng(rng)
+    order = np.argsort(-scores, kind='stable')
+    keys = -scores[order] # ascending
+    r = _sample_cdf(weights, num_samples, rng)
+    lo = np.searchsorted(keys, keys[r], side='left')
+    hi = np.searchsorted(keys, keys[r], side='right')
+    return order[lo + (rng.random(num_samples) * (hi - lo)).astype(np.int64)]
+
+
+def tournament_selection(scores, num_parents, tournament_size, rng=None):
+    """ Run num_parents tournaments at once
+
+    Each tournament is won by the fittest of tournament_size distinct
+    genomes, drawn uniformly without replacement, like selection.
+    Ties between equally fit entrants are broken uniformly at random.
+
+    Rather than drawing the entrants of every tournament, which costs
+    O(num_parents * P) for argpartition over random keys (or Gumbel
+    top-k), winners are sampled from the exact distribution: the genome
+    ranked r-th fittest (from 0) wins a tournament when it is drawn and
+    the other T - 1 entrants all come from the P - 1 - r genomes ranked
+    below it, with probability C(P - 1 - r, T - 1) / C(P, T). That
+    costs one sort, O(P log P), for the whole generation. A rank tied
+    with others stands for any of the tied genomes, so the winner is
+    drawn uniformly from them (see _sample_ranked)
+
+    Returns
+    -------
+    winners : ndarray.int64; (num_parents,)
+        population index of the fittest genome in each tournament
+    """
+    P = len(scores)
+    r = np.arange(P - 1)
+    # p[r+1] / p[r] == (P - T - r) / (P - 1 - r)
+    ratios = np.maximum(P - tournament_size - r, 0) / (P - 1 - r)
+    probs = np.empty(P)
+    probs[0] = tournament_size / P
+    np.cumprod(ratios, out=probs[1:])
+    probs[1:] *= probs[0]
+    return _sample_ranked(scores, probs, num_parents, rng)
+
+
+def rank_selection(scores, num_parents, pressure=1.5, rng=None):
+    """ Linear ranking selection
+
+    The genome ranked r-th fittest (from 0) is selected with probability
+    proportional to pressure - 2 * (pressure - 1) * r / (P - 1), so the
+    fittest genome has pressure expected offspring and the least fit
+    2 - pressure. Only ranks matter, not the scale of the scores;
+    tied genomes share the mean weight of their ranks
+    """
+    if not 1 <= pressure <= 2:
+        raise ValueError('rank selection pressure must be in [1, 2]')
+    P = len(scores)
+    weights = pressure - 2 * (pressure - 1) * np.arange(P) / max(P - 1, 1)
+    return _sample_ranked(scores, weights, num_parents, rng)
+
+
+def truncation_selection(scores, num_parents, fraction=0.5, rng=None):
+    """ parents drawn uniformly from the fittest fraction of the population
+
+    Genomes tied at the cutoff make it in at random
+    """
+    rng = get_rng(rng)
+    P = len(scores)
+    k = min(P, max(1, int(round(fraction * P))))
+    fittest = np.lexsort((rng.random(P), -scores))[:k]
+    return fittest[rng.integers(0, k, num_parents)]
+
+
+def _proportions(scores):
+    """ roulette wheel weights; scores are shifted to be non-negative """
+    weights = scores - min(scores.min(), 0)
+    if not weights.any():
+        weights = np.ones(len(scores))
+    return weights
+
+
+def roulette_selection(scores, num_parents, rng=None):
+    """ fitness proportionate selection """
+    return _sample_cdf(_proportions(scores), num_parents, rng)
+
+
+def sus_selection(scores, num_parents, rng=None):
+    """ fitness proportionate selection, by stochastic universal sampling
+
+    Each genome gets either floor or ceil of its expected number of
+    parents. Parents are returned shuffled, since they are paired by
+    position
+    """
+    rng = get_rng(rng)
+    parents = _sample_cdf(_proportions(scores), num_parents, rng,
+                          universal=True)
+    return rng.permutation(parents)
+
+
+SELECTIONS = {'tournament': tournament_selection,
+              'rank': rank_selection,
+              'truncation': truncation_selection,
+              'roulette': roulette_selection,
+              'sus': sus_selection}
+
+def selection_operator(name, **params):
+    """ selection strategy with its parameters bound,
+    called as strategy(scores, num_parents, rng=rng)
+    """
+    return functools.partial(SELECTIONS[name], **params)
+
+
+#-----------------------------------------------------------------------------#
+#                                Fitness sharing                              #
+#-----------------------------------------------------------------------------#
+""" Diversity preservation by fitness sharing
+
+Each genome's fitness is divided by its niche count, the number of
+genomes crowding it (itself included), so a cluster of near-clones
+shares one niche's worth of fitness instead of taking over the
+population:
+
+    m_i = sum_j sh(d_ij),    sh(d) = 1 - (d / sigma)^alpha  if d < sigma
+                                     0                      otherwise
+
+where d_ij is the euclidean distance between the genes of genomes i and
+j, and sigma the niche radius. Distances come from the expansion
+|a - b|^2 = |a|^2 + |b|^2 - 2 a.b, so each block of rows of the P x P
+distance matrix is a single GEMM, and only one block exists at a time.
+
+With sample_size, niche counts are instead estimated against a random
+sample of that many genomes, for O(P * sample_size) time, for
+populations too large for P x P distances. Shared fitness assumes
+non-negative scores, like roulette selection.
+"""
+
+_share_block_size = 2**22 # max distance matrix entries per block
+
+class FitnessSharing:
+    """ Shared fitness of a population, for selection
+
+    Params
+    ------
+    sigma : float
+        niche radius, in gene units (distances are between dequantized
+        genomes)
+    alpha : float
+        shape of the sharing function; 1 is triangular
+    sample_size : int
+        estimate niche counts against this many sampled genomes;
+        exact (all P genomes) if None or >= P
+    block_size : int
+        max entries of each block of the distance matrix
+    """
+    def __init__(self, sigma, alpha=1.0, sample_size=None,
+                 block_size=_share_block_size):
+        self.sigma = sigma
+        self.alpha = alpha
+        self.sample_size = sample_size
+        self.block_size = block_size
+
+    def __repr__(self):
+        return '{}(sigma={}, alpha={}, sample_size={})'.format(
+               self.__class__.__name__, self.sigma, self.alpha,
+               self.sample_size)
+
+    def niche_counts(self, population, rng=None):
+        """ Niche count of every genome
+
+        Returns
+        -------
+        counts : ndarray.float64; (P,)
+            m_i >= 1; sampled counts are scaled up to the population,
+            with each genome counting itself exactly once
+        """
+        P = len(population)
+        genes = dequantize(population).reshape(P, -1)
+        sq_norms = np.einsum('ij,ij->i', genes, genes)
+
+        # Reference genomes
+        sampled = self.sample_size is not None and self.sample_size < P
+        if sampled:
+            ref = get_rng(rng).choice(P, self.sample_size, replace=False)
+            ref_genes, ref_norms = genes[ref], sq_norms[ref]
+        else:
+            ref_genes, ref_norms = genes, sq_norms
+
+        # Blocks of rows of the distance matrix, one GEMM each
+        S = len(ref_genes)
+        counts = np.empty(P)
+        # the expansion cancels to rounding error for near-clones, so
+        # squared distances below that error are taken as 0
+        tol = 8 * np.finfo(np.float32).eps * sq_norms.max()
+        inv_sigma_sq = np.float32(1 / self.sigma**2)
+        d = np.empty((max(1, min(P, self.block_size // S)), S), np.float32)
+        for rows in _chunks(P, len(d)):
+            block = d[:rows.stop - rows.start]
+            np.matmul(genes[rows], ref_genes.T, out=block)
+            block *= -2
+            block += sq_norms[rows, None]
+            block += ref_norms
+            np.copyto(block, 0, where=block < tol) # |a - b|^2
+            block *= inv_sigma_sq                  # (d / sigma)^2
+            if self.alpha == 1:
+                np.sqrt(block, out=block)
+            elif self.alpha != 2:
+                np.power(block, np.float32(self.alpha / 2), out=block)
+            np.subtract(1, block, out=block)
+            np.maximum(block, 0, out=block) # sh(d)
+            counts[rows] = block.sum(axis=1, dtype=np.float64)
+
+        if sampled:
+            # every genome counts itself once, and the others at the
+            # rate sampled genomes crowd it
+            in_sample = np.zeros(P, bool)
+            in_sample[ref] = True
+            counts -= in_sample  # sh(d_ii) == 1
+            counts *= (P - 1) / (S - in_sample)
+            counts += 1
+        return counts
+
+    def __call__(self, population, scores, rng=None):
+        """ scores divided by niche counts """
+        return scores / self.niche_counts(population, rng)
+
+
+#-----------------------------------------------------------------------------#
+#                            Vectorized generation                            #
+#-----------------------------------------------------------------------------#
+""" Bulk versions of the selection, crossover and mutation operators above.
+
+Rather than looping pop_size // 2 times with a small RNG draw per
+operator call, each stage draws all of its randomness for a generation
+at once, so the per-generation cost is a handful of numpy calls
+regardless of population size. The distributions match the single
+genome operators.
+"""
+
+def _swap_genes(a, b, mask):
+    """ swap a and b where mask, in-place and without temporaries """
+    a = a.view(np.dtype('u{}'.format(a.itemsize)))
+    b = b.view(a.dtype)
+    np.bitwise_xor(a, b, out=a, where=mask)
+    np.bitwise_xor(a, b, out=b, where=mask)
+    np.bitwise_xor(a, b, out=a, where=mask)
+
+
+def crossover(population, idx_1, idx_2, out, rng=None):
+    """ Multi-point crossover for all parent pairs at once
+
+    Equivalent to calling reproduce on each (idx_1[i], idx_2[i]) pair.
+    The first child of every pair is written to out[:H], the second to
+    out[H:], where H = len(idx_1). If out has an odd number of rows,
+    the second child of the last pair is dropped.
+    """
+    H = len(idx_1)
+    c1, c2 = out[:H], out[H:]
+    n2 = len(c2)
+
+    # Crossover points, (H, D, K)
+    gene_mask = get_rng(rng).integers(0, 2, c1.shape, dtype=bool)
+
+    # Gather parents straight into the child buffers, then exchange
+    # the genes each child inherits from the other parent
+    np.take(population, idx_1, axis=0, out=c1)
+    np.take(population, idx_2[:n2], axis=0, out=c2)
+    _swap_genes(c1[:n2], c2, ~gene_mask[:n2])
+    if n2 < H:
+        np.copyto(c1[n2:], population[idx_2[n2:]], where=~gene_mask[n2:])
+    return out
+
+
+def mutate_population(population, mutation_rate, rng=None):
+    """ Mutate every genome in population in-place
+
+    Each gene mutates independently with probability mutation_rate.
+    Rather than drawing a uniform per gene, the gaps between successive
+    mutation sites are drawn from their geometric distribution, in
+    blocks of at most _mutation_chunk sites, and only as many
+    replacement genes as there are sites are sampled. The distribution
+    is the same as a per-gene mask, but the extra memory is bounded by
+    the block size, not by the population size
+    """
+    rng = get_rng(rng)
+    if mutation_rate <= 0:
+        return population
+    size = population.size
+    expected = size * mutation_rate
+    chunk = int(min(_mutation_chunk, expected + 4 * np.sqrt(expected) + 16))
+    site = -1 # last mutated gene
+    while True:
+        sites = np.cumsum(rng.geometric(mutation_rate, chunk))
+        sites += site
+        num_sites = np.searchsorted(sites, size)
+        genes = sample_genes(population.shape[1:], num_sites,
+                             population.dtype, rng)
+        np.put(population, sites[:num_sites], genes)
+        if num_sites < chunk:
+            return population
+        site = sites[-1]
+
+
+def evolve_generation(population, scores, tournament_size, mutation_rate,
+                      out, timer=None, rng=None, selection=None):
+    """ Produce the next generation from population in a single pass
+
+    Params
+    ------
+    population : ndarray; (P, D, K)
+        current generation
+    scores : ndarray; (P,)
+        fitness of the current generation
+    tournament_size : int
+        how many genomes in each tournament
+    mutation_rate : float
+        probability any gene of an offspring is resampled
+    out : ndarray; (P, D, K)
+        buffer for the next generation; must not be population
+    timer : PhaseTimer
+        optional timer for the selection, crossover and mutation phases
+    rng : np.random.Generator
+        random stream
+    selection : callable
+        selection strategy (see selection_operator); tournaments of
+        tournament_size by default
+
+    Returns
+    -------
+    parents : ndarray.int64; (P,)
+        index of the parent each offspring in out started as a copy
+        of, before crossover and mutation
+    """
+    P = len(out)
+    H = (P + 1) // 2
+    if selection is None:
+        parents = tournament_selection(scores, 2 * H, tournament_size, rng)
+    else:
+        parents = selection(scores, 2 * H, rng=rng)
+    if timer is not None: timer.lap('selection')
+    crossover(population, parents[:H], parents[H:], out, rng)
+    if timer is not None: timer.lap('crossover')
+    mutate_population(out, mutation_rate, rng)
+    if timer is not None: timer.lap('mutation')
+    return parents[:P]
+
+
+#-----------------------------------------------------------------------------#
+#                             Incremental fitness                             #
+#-----------------------------------------------------------------------------#
+""" Offspring logits from their parent's cached logits
+
+An offspring only differs from the parent it was copied from where it
+inherited a different gene from the other parent, or was mutated. As
+populations converge, parents share most of their genes, so these
+differences are sparse. For a batch x the offspring logits are then
+
+    x.child == x.parent + x[:, rows].(child - parent)[rows]
+
+where rows are the features (rows of the genome) with any changed gene,
+so the cost is proportional to the fraction of changed rows rather than
+a full (N, D).(D, K) matmul per offspring.
+
+This only applies while the batch stays the same, see gens_per_batch
+in genetic_algorithm.
+"""
+
+_incremental_max_changed = 0.25 # beyond this fraction of changed rows,
+                                # a full batched matmul is faster
+
+def offspring_logits(x, parent_logits, population, offspring, parents,
+                     out=None):
+    """ logits of offspring on batch x, updated from their parents'
+
+    Params
+    ------
+    x : ndarray; (N, D)
+        the batch parent_logits were computed on
+    parent_logits : ndarray; (P, N, K)
+        logits of population on x
+    population : ndarray; (P, D, K)
+        parent generation
+    offspring : ndarray; (P, D, K)
+        next generation
+    parents : ndarray.int; (P,)
+        index into population of the parent each offspring derives from
+    out : ndarray; (P, N, K)
+        optional buffer for the offspring logits; must not be parent_logits
+
+    Returns
+    -------
+    h : ndarray; (P, N, K)
+        logits of offspring on x
+    """
+    delta = np.subtract(offspring, population[parents], dtype=np.float32)
+    child, row = np.nonzero(np.any(delta, axis=-1)) # changed (child, row)
+
+    # Dense offspring are cheaper to score from scratch
+    P, D = delta.shape[:2]
+    if len(child) > _incremental_max_changed * P * D:
+        return population_logits(x, offspring, out=out)
+
+    h = np.take(parent_logits, parents, axis=0, out=out)
+
+    # nonzero is ordered by child, so each child's rows are a segment
+    bounds = np.flatnonzero(np.diff(child, prepend=-1, append=-1))
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        c, rows = child[start], row[start:stop]
+        h[c] += np.matmul(x[:, rows], delta[c, rows]) # (N, r).(r, K)
+    return h
+
+
+#-----------------------------------------------------------------------------#
+#                                Fitness cache                                #
+#-----------------------------------------------------------------------------#
+
+class FitnessCache:
+    """ Bounded LRU memo of genome fitness scores
+
+    Scores are keyed by the fitness function, a digest of the batch
+    (x, y) and a digest of the genome, so bit-identical genomes (fit
+    genomes that survive unchanged, or offspring that inherited every
+    gene from one parent) are only scored once per batch and objective.
+    Digests cover dtype and shape as well as the bytes, and the key
+    holds a reference to the fitness function, so one cache can be
+    shared across objectives and datasets without stale hits.
+
+    Digesting a genome reads its D*K genes once, which is much cheaper
+    than the (N, D).(D, K) matmul it saves.
+
+    Attributes
+    ----------
+    maxsize : int
+        max number of cached scores; least recently used are evicted
+    hits, misses : int
+        number of scores served from, or computed for, the cache
+    """
+    def __init__(self, maxsize=_fitness_cache_size):
+        self.maxsize = maxsize
+        self._scores = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __repr__(self):
+        return ('{}(size={}, hits={}, misses={}, hit_rate={:.3f})'
+                .format(self.__class__.__name__, len(self), self.hits,
+                        self.misses, self.hit_rate))
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @staticmethod
+    def digest(arr):
+        h = hashlib.blake2b(digest_size=16)
+        h.update('{}{}'.format(arr.dtype.str, arr.shape).encode())
+        h.update(np.ascontiguousarray(arr))
+        return h.digest()
+
+    def batch_key(self, x, y, fitness_fn=None):
+        """ key prefix for scores of fitness_fn (None for accuracy) on
+        the batch
+        """
+        return fitness_fn, self.digest(x) + self.digest(y)
+
+    def get(self, key):
+        """ cached score for key, or None """
+        score = self._scores.get(key)
+        if score is not None:
+            self._scores.move_to_end(key)
+        return score
+
+    def put(self, key, score):
+        self._scores[key] = score
+        self._scores.move_to_end(key)
+        if len(self._scores) > self.maxsize:
+            self._scores.popitem(last=False)
+
+    def clear(self):
+        self._scores.clear()
+        self.hits = self.misses = 0
+
+    # Fitness
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    def fitness(self, x, y, g):
+        """ memoized fitness """
+        key = self.batch_key(x, y) + (self.digest(g),)
+        score = self.get(key)
+        if score is None:
+            self.misses += 1
+            score = fitness(x, y, g)
+            self.put(key, score)
+        else:
+            self.hits += 1
+        return score
+
+    def population_fitness(self, x, y, population, out=None, fitness_fn=None):
+        """ memoized population_fitness
+
+        Only genomes without a cached score are scored, in a single
+        batched matmul over the distinct genomes among them
+
+        With a fitness_fn (see Fitness functions), the distinct uncached
+        genomes are scored by it instead, in one batched call
+        """
+        if out is None:
+            out = np.empty(len(population),
+                           np.int64 if fitness_fn is None else np.float64)
+        batch = self.batch_key(x, y, fitness_fn)
+
+        # Look up cached scores, group uncached genomes by key
+        missing = OrderedDict()
+        for i, g in enumerate(population):
+            key = batch + (self.digest(g),)
+            score = self.get(key)
+            if score is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                out[i] = score
+        self.hits += len(population) - len(missing)
+        self.misses += len(missing)
+
+        # Score distinct uncached genomes
+        if missing:
+            first = [idx[0] for idx in missing.values()]
+            scores = (fitness_fn or population_fitness)(x, y, population[first])
+            for (key, idx), score in zip(missing.items(), scores):
+                out[idx] = score
+                self.put(key, score)
+        return out
+
+
+#-----------------------------------------------------------------------------#
+#                              Fitness functions                              #
+#-----------------------------------------------------------------------------#
+""" Pluggable objectives
+
+A fitness function scores a whole population at once: it takes a batch
+(x, y) and a (P, D, K) population, and returns a (P,) vector of scores,
+higher is fitter
+
+    scores = fitness_fn(x, y, population)
+
+population_fitness (classifier accuracy) is the default objective, and
+is already vectorized over the population. Objectives only defined per
+genome are lifted with GenomeFitness, and expensive objectives are
+spread over cores by a FitnessEvaluator. Functions dispatched to a
+process pool must be picklable, ie. defined at module level.
+"""
+
+class GenomeFitness:
+    """ batched fitness function from a per-genome one, fn(x, y, g) """
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__,
+                               getattr(self.fn, '__name__', self.fn))
+
+    def __call__(self, x, y, population):
+        return np.array([self.fn(x, y, g) for g in population], np.float64)
+
+
+def _score_chunk(args):
+    """ score one chunk of genomes, in a pool worker """
+    fitness_fn, x, y, genomes = args
+    return fitness_fn(x, y, genomes)
+
+
+class FitnessEvaluator:
+    """ Batched fitness function, run by the chosen executor
+
+    Executors
+    ---------
+    'vectorized' : fitness_fn is called once on the whole population,
+        in-process; for cheap numpy objectives like the default
+    'thread' : chunks of the population are scored in a thread pool;
+        for objectives that release the GIL (numpy, native code, I/O)
+    'process' : chunks of the population are scored in a process pool;
+        for expensive pure-python objectives. Each chunk is pickled to
+        its worker along with the batch, which is negligible next to an
+        objective costing milliseconds per genome
+
+    Pools are created on first use and kept across generations, so
+    close the evaluator when done (or use it as a context manager)
+
+    Params
+    ------
+    fitness_fn : callable
+        batched fitness function; fitness_fn(x, y, population) ---> (P,)
+    executor : str
+        'vectorized', 'thread' or 'process'
+    num_workers : int
+        pool size, default os.cpu_count()
+    chunk_size : int
+        genomes per task; by default each worker gets about 4 chunks of
+        the population, to balance genomes of uneven cost
+    """
+    executors = ('vectorized', 'thread', 'process')
+
+    def __init__(self, fitness_fn=population_fitness, executor='vectorized',
+                 num_workers=None, chunk_size=None):
+        if executor not in self.executors:
+            raise ValueError('unknown fitness executor {}'.format(executor))
+        self.fitness_fn = fitness_fn
+        self.executor = executor
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._pool = None
+
+    def __repr__(self):
+        return '{}({}, executor={!r}, num_workers={})'.format(
+               self.__class__.__name__, getattr(self.fitness_fn, '__name__',
+               self.fitness_fn), self.executor, self.num_workers)
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            pool_type = ThreadPool if self.executor == 'thread' else Pool
+            self._pool = pool_type(self.num_workers)
+        return self._pool
+
+    def __call__(self, x, y, population, out=None):
+        if self.executor == 'vectorized':
+            scores = self.fitness_fn(x, y, population)
+        else:
+            P = len(population)
+            chunk_size = self.chunk_size or -(-P // (4 * self.num_workers))
+            tasks = [(self.fitness_fn, x, y, population[genomes])
+                     for genomes in _chunks(P, chunk_size)]
+            scores = np.concatenate(self.pool.map(_score_chunk, tasks,
+                                                  chunksize=1))
+        if out is None:
+            return scores
+        out[...] = scores
+        return out
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+#-----------------------------------------------------------------------------#
+#                               Instrumentation                               #
+#-----------------------------------------------------------------------------#
+
+class PhaseTimer:
+    """ Cumulative wall time spent in each phase of a GA run
+
+    Phases are timed as laps: lap(phase) charges the time since the
+    previous lap (or start) to phase. That is a single perf_counter
+    call per phase, so the timer is cheap enough to always leave on.
+
+    Attributes
+    ----------
+    totals : dict(str: float)
+        total seconds spent in each phase
+    """
+    def __init__(self):
+        self.totals = {}
+        self._last = None
+
+    def start(self):
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.totals[phase] = self.totals.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def fractions(self):
+        """ fraction of total timed wall time spent in each phase """
+        total = sum(self.totals.values()) or 1.0
+        return {phase: t / total for phase, t in self.totals.items()}
+
+    def __repr__(self):
+        phases = ', '.join('{}={:.4f}s'.format(phase, t)
+                           for phase, t in self.totals.items())
+        return '{}({})'.format(self.__class__.__name__, phases)
+
+
+def population_diversity(population):
+    """ mean over genes of the population's std. dev., in gene units
+
+    Accumulated over blocks of _genome_chunk genomes, so no temporary
+    the size of the population is made, and scaled by genome_scale so
+    populations stored as float32, float16 or int8 compare directly
+    """
+    P = len(population)
+    total = np.zeros(population.shape[1:], np.float64)
+    total_sq = np.zeros(population.shape[1:], np.float64)
+    for genomes in _chunks(P, _genome_chunk):
+        g = population[genomes].astype(np.float64)
+        total += g.sum(axis=0)
+        total_sq += np.einsum('p...,p...->...', g, g)
+    mean = total / P
+    var = np.maximum(total_sq / P - mean * mean, 0)
+    scale = genome_scale(population.shape[-2:], population.dtype)
+    return float(np.sqrt(var).mean() * scale)
+
+
+def fitness_stats(population, scores, batch_size=None):
+    """ summary statistics of a generation's fitness
+
+    Returns
+    -------
+    stats : dict
+        'min', 'mean', 'max' : accuracy on the generation's batch, or
+            the raw scores if batch_size is None (custom objectives)
+        'diversity' : population_diversity, mean over genes of the
+            population's std. dev. in gene units
+    """
+    accuracy = scores / batch_size if batch_size else scores
+    return {'min': float(accuracy.min()),
+            'mean': float(accuracy.mean()),
+            'max': float(accuracy.max()),
+            'diversity': population_diversity(population)}
+
+
+class GenerationState:
+    """ What genetic_algorithm passes to its callbacks
+
+    Attributes
+    ----------
+    gen : int
+        generation number
+    population : ndarray; (P, D, K)
+        current generation (do not modify)
+    scores : ndarray; (P,)
+        fitness of population, None at generation start
+    stats : dict
+        fitness_stats of the generation, None at generation start
+    timer : PhaseTimer
+        phase times of the run so far
+    stop : bool
+        set by a callback to stop after this generation
+    """
+    def __init__(self, timer):
+        self.gen = 0
+        self.population = None
+        self.scores = None
+        self.stats = None
+        self.timer = timer
+        self.stop = False
+
+
+class Callback:
+    """ Base class for genetic_algorithm hooks """
+    def on_generation_start(self, state):
+        pass
+
+    def on_generation_end(self, state):
+        pass
+
+
+class EarlyStopping(Callback):
+    """ Stop evolving once fitness plateaus
+
+    Stops when the monitored stat has not improved by more than
+    min_delta for patience generations. Since each generation is
+    scored on a small batch, the stat is smoothed with an exponential
+    moving average first.
+    """
+    def __init__(self, monitor='mean', patience=20, min_delta=1e-3,
+                 smoothing=0.9):
+        self.monitor = monitor
+        self.patience = patience
+        self.min_delta = min_delta
+        self.smoothing = smoothing
+        self.best = -np.inf
+        self.wait = 0
+        self._ema = None
+
+    def on_generation_end(self, state):
+        value = state.stats[self.monitor]
+        if self._ema is None:
+            self._ema = value
+        self._ema = self.smoothing * self._ema + (1 - self.smoothing) * value
+        if self._ema > self.best + self.min_delta:
+            self.best = self._ema
+            self.wait = 0
+        else:
+            self.wait += 1
+            if self.wait >= self.patience:
+                state.stop = True
+
+
+class ProgressLogger(Callback):
+    """ print fitness stats and phase times every `every` generations """
+    def __init__(self, every=10):
+        self.every = every
+
+    def on_generation_end(self, state):
+        if state.gen % self.every == 0 or state.stop:
+            stats = state.stats
+            times = state.timer.fractions()
+            print('gen {:>5}: fitness min {:.3f} mean {:.3f} max {:.3f}, '
+                  'diversity {:.4f} | {}'.format(state.gen, stats['min'],
+                  stats['mean'], stats['max'], stats['diversity'],
+                  ' '.join('{} {:.0%}'.format(k, v) for k, v in times.items())))
+
+
+class TargetAccuracy(Callback):
+    """ Stop once the population vote reaches a target accuracy
+
+    For comparing engines (genetic_algorithm, evolution_strategy) on
+    wall time to a target. The population is evaluated on the
+    validation split every `every` generations; evaluation time is
+    included in the wall time, so keep the split small
+
+    Attributes
+    ----------
+    accuracy : float
+        accuracy at the last evaluation
+    generation : int
+        generation at which the target was reached, or None
+    seconds : float
+        wall time from the first generation until the target was reached
+    """
+    def __init__(self, dataset, target, every=1):
+        self.X = dataset.x_validation
+        self.Y = dataset.y_validation
+        self.target = target
+        self.every = every
+        self.accuracy = 0.0
+        self.generation = self.seconds = None
+        self._start = None
+
+    def on_generation_start(self, state):
+        if self._start is None:
+            self._start = time.perf_counter()
+
+    def on_generation_end(self, state):
+        if state.gen % self.every or self.generation is not None:
+            return
+        Y_hat = population_predict(self.X, state.population)
+        self.accuracy = float(np.mean(Y_hat == self.Y))
+        if self.accuracy >= self.target:
+            self.generation = state.gen
+            self.seconds = time.perf_counter() - self._start
+            state.stop = True
+
+
+#-----------------------------------------------------------------------------#
+#                                 Checkpoints                                 #
+#-----------------------------------------------------------------------------#
+
+class Checkpoint:
+    """ Memory-mapped checkpoint of a genetic_algorithm run
+
+    A checkpoint is a directory with
+        population.npy : (2, P, D, K) array, memory-mapped
+            two population slots, the saved population and a spare
+        state.json : the generation counter, which of the two
+            slots holds the saved population, and the RNG states
+            (the run's Generator, and the legacy global RNG that
+            datasets draw their batches from)
+
+    genetic_algorithm evolves its population in memory. A save copies
+    it into the spare slot and flushes it, and only then atomically
+    replaces the state file to point at it. Nothing ever writes to the
+    slot the state file points at, so a crash at any time leaves the
+    last complete checkpoint (population, generation and RNG states)
+    intact.
+
+    Attributes
+    ----------
+    path : str
+        checkpoint directory
+    buffers : np.memmap; (2, P, D, K)
+        population slots
+    generation : int
+        number of generations completed (0 for a new checkpoint)
+    current : int
+        index of the saved population in buffers
+    bit_generator : str
+        name of the saved Generator's bit generator (None until saved)
+    """
+    population_file = 'population.npy'
+    state_file = 'state.json'
+
+    def __init__(self, path, buffers, generation=0, current=0):
+        self.path = path
+        self.buffers = buffers
+        self.generation = generation
+        self.current = current
+        self.bit_generator = None
+        self._rng_states = None
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.isfile(os.path.join(path, cls.state_file))
+
+    @classmethod
+    def create(cls, path, shape, dtype=np.float32):
+        """ new checkpoint for a population of shape (P, D, K) """
+        os.makedirs(path, exist_ok=True)
+        fname = os.path.join(path, cls.population_file)
+        buffers = np.lib.format.open_memmap(fname, mode='w+', dtype=dtype,
+                                            shape=(2,) + tuple(shape))
+        return cls(path, buffers)
+
+    @classmethod
+    def load(cls, path):
+        """ memory-map an existing checkpoint """
+        with open(os.path.join(path, cls.state_file)) as f:
+            state = json.load(f)
+        fname = os.path.join(path, cls.population_file)
+        buffers = np.load(fname, mmap_mode='r+')
+        checkpoint = cls(path, buffers, state['generation'], state['current'])
+        checkpoint.bit_generator = state['rng']['bit_generator']
+        checkpoint._rng_states = state['rng'], state['np_random']
+        return checkpoint
+
+    @classmethod
+    def open(cls, path, shape, dtype=np.float32, bit_generator=_bit_generator):
+        """ load the checkpoint at path if there is one, else create it
+
+        An existing checkpoint is only resumed if it was saved with the
+        same population shape, genome dtype and bit generator
+        """
+        if not cls.exists(path):
+            return cls.create(path, shape, dtype)
+        checkpoint = cls.load(path)
+        saved = (checkpoint.buffers.shape[1:], checkpoint.buffers.dtype,
+                 checkpoint.bit_generator)
+        given = (tuple(shape), np.dtype(dtype),
+                 BIT_GENERATORS[bit_generator].__name__)
+        if saved != given:
+            raise ValueError('checkpoint at {} has (shape, dtype, bit '
+                             'generator) {}, not {}'.format(path, saved, given))
+        return checkpoint
+
+    @property
+    def population(self):
+        """ the saved population """
+        return self.buffers[self.current]
+
+    def save(self, population, generation, rng):
+        """ checkpoint population after generation
+
+        population is written to the spare slot, which becomes the saved
+        population once it is flushed and the state file is replaced
+        """
+        spare = 1 - self.current if self.generation else self.current
+        np.copyto(self.buffers[spare], population)
+        self.buffers.flush()
+        self.current = spare
+        self.generation = generation
+
+        # RNG states; array fields (eg, Philox counters) stored as lists
+        bit_state = {k: v.tolist() if isinstance(v, np.ndarray) else v
+                     for k, v in rng.bit_generator.state.items()}
+        if isinstance(bit_state['state'], dict):
+            bit_state['state'] = {k: np.asarray(v).tolist() for k, v
+                                  in bit_state['state'].items()}
+        name, keys, pos, has_gauss, cached_gauss = np.random.get_state()
+        state = {'generation': generation, 'current': self.current,
+                 'rng': bit_state,
+                 'np_random': [name, keys.tolist(), pos, has_gauss,
+                               cached_gauss]}
+
+        # atomic replace, so a crash never leaves a partial state file
+        fname = os.path.join(self.path, self.state_file)
+        with open(fname + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(fname + '.tmp', fname)
+
+    def restore_rng(self, rng):
+        """ restore the saved RNG states, into rng for the Generator """
+        if self._rng_states is None:
+            return
+        bit_state, np_random = self._rng_states
+        as_array = lambda v: np.array(v, np.uint64) if isinstance(v, list) else v
+        bit_state = {k: as_array(v) for k, v in bit_state.items()}
+        if isinstance(bit_state['state'], dict):
+            bit_state['state'] = {k: as_array(v) for k, v
+                                  in bit_state['state'].items()}
+        rng.bit_generator.state = bit_state
+
+        name, keys, pos, has_gauss, cached_gauss = np_random
+        np.random.set_state((name, np.array(keys, np.uint32), pos,
+                             has_gauss, cached_gauss))
+
 
 #-----------------------------------------------------------------------------#
 #                             Genetic algorithms                              #
 #-----------------------------------------------------------------------------#
 
 def genetic_algorithm(dataset, num_gens, pop_size, tourney_size, mute_rate,
-                      batch_size=_batch_size, seed=_seed):
+                      batch_size=_batch_size, seed=_seed, population=None,
+                      gens_per_batch=1, fitness_cache=None, callbacks=(),
+                      timer=None, checkpoint=None,
+                      checkpoint_interval=_checkpoint_interval,
+                      genome_dtype=_genome_dtype, rng=None, fitness_fn=None,
+                      selection=None, sharing=None):
     """ fully specified genetic algorithm for classification problems
 
     returns a population of genomes evolved on dataset over num_gens
@@ -225,6 +1546,43 @@ def genetic_algorithm(dataset, num_gens, pop_size, tourney_size, mute_rate,
     tournaments to select two parents. The more efficient choice would
     be to simply select the fittest 2 genomes from a single tournament,
     but there is greater genetic diversity by selecting from two tourn.
+
+    If an existing population array is given, it is evolved in-place
+    (the final generation is written back into it) instead of
+    initializing a new one from seed
+
+    With gens_per_batch > 1, each batch is reused for that many
+    generations, and within that window offspring are scored
+    incrementally from their parents' logits (see offspring_logits)
+
+    If a FitnessCache is given, generations are scored through it
+    instead, so only genomes not yet seen on the batch are evaluated
+
+    fitness_fn replaces the default accuracy objective with any batched
+    fitness function, eg. a FitnessEvaluator (see Fitness functions);
+    every generation is then scored by it, through the cache if given
+
+    Parents are picked by tournaments of tourney_size, or by any other
+    selection strategy (see selection_operator). With a FitnessSharing,
+    selection sees shared fitness, so crowded niches are penalized;
+    callbacks still see the raw scores
+
+    Each Callback in callbacks is called at the start and end of every
+    generation, and may stop the run early (see EarlyStopping). The
+    time spent in each phase (batch, fitness, selection, crossover,
+    mutation) is accumulated in timer, a PhaseTimer
+
+    With a Checkpoint, the population is saved every checkpoint_interval
+    generations. If the checkpoint holds a previous run, that run is
+    resumed from its last saved generation (and population, if given,
+    is overwritten with the saved one)
+
+    New populations are stored as genome_dtype ('float32', 'float16'
+    or 'int8'); all operators work natively on that storage
+
+    All GA randomness is drawn from rng, a np.random.Generator, or a new
+    stream seeded by seed (see make_rng). Batches are drawn by the
+    dataset, which may use its own RNG
     """
 
     # Initialize genetic pool
@@ -232,69 +1590,662 @@ def genetic_algorithm(dataset, num_gens, pop_size, tourney_size, mute_rate,
     num_feat  = dataset.X.shape[-1]
     num_class = len(dataset.target_names)
     gene_size = (num_feat, num_class)
-    population = init_population(gene_size, pop_size, seed)
+    rng = make_rng(seed) if rng is None else rng
+    start_gen = 0
+    if checkpoint is not None and checkpoint.generation:
+        start_gen = checkpoint.generation
+        checkpoint.restore_rng(rng)
+        if population is None:
+            population = np.array(checkpoint.population)
+        else:
+            np.copyto(population, checkpoint.population)
+    elif population is None:
+        population = init_population(gene_size, pop_size, seed, genome_dtype,
+                                     rng)
+    initial_population = population
+
+    # Double-buffered generations: offspring are written directly into
+    # next_generation, which is then swapped with the current population
+    next_generation = np.empty_like(population)
+    scores = np.empty(pop_size, np.int64 if fitness_fn is None else np.float64)
+    logits = next_logits = None
+
+    # Instrumentation
+    if timer is None:
+        timer = PhaseTimer()
+    state = GenerationState(timer)
 
     # Evolve population
-    for gen in range(num_gens):
-        x, y = dataset.get_batch(batch_size)
-        next_generation = []
+    incremental = fitness_cache is None and fitness_fn is None
+    for gen in range(start_gen, num_gens):
+        state.gen = gen
+        state.population = population
+        state.scores = state.stats = None
+        for callback in callbacks:
+            callback.on_generation_start(state)
+        timer.start()
+
+        if gen % gens_per_batch == 0 or gen == start_gen:
+            x, y = dataset.get_batch(batch_size)
+            timer.lap('batch')
+            if incremental:
+                logits = population_logits(x, population, out=logits)
+                if next_logits is None:
+                    next_logits = np.empty_like(logits)
+
+        # Fitness, evaluated once per generation
+        if incremental:
+            logits_fitness(logits, y, out=scores)
+        elif fitness_cache is not None:
+            fitness_cache.population_fitness(x, y, population, out=scores,
+                                             fitness_fn=fitness_fn)
+        else:
+            scores[...] = fitness_fn(x, y, population)
+        timer.lap('fitness')
+
+        # Generation stats
+        if callbacks:
+            state.scores = scores
+            state.stats = fitness_stats(population, scores,
+                                        len(y) if fitness_fn is None else None)
+
+        # Fitness sharing
+        select_scores = scores
+        if sharing is not None:
+            select_scores = sharing(population, scores, rng)
+            timer.lap('sharing')
+
+        # Selection, reproduction & mutation
+        parents = evolve_generation(population, select_scores, tourney_size,
+                                    mute_rate, out=next_generation,
+                                    timer=timer, rng=rng, selection=selection)
+
+        # Offspring logits on a reused batch
+        if incremental and (gen + 1) % gens_per_batch != 0:
+            offspring_logits(x, logits, population, next_generation,
+                             parents, out=next_logits)
+            logits, next_logits = next_logits, logits
+            timer.lap('fitness')
+
+        for callback in callbacks:
+            callback.on_generation_end(state)
 
-        # Selection & Reproduction
-        for _ in range(pop_size // 2):
-            # tournament
-            parent_1 = selection(x, y, population, tourney_size)
-            parent_2 = selection(x, y, population, tourney_size)
+        # update population
+        population, next_generation = next_generation, population
 
-            # crossover & mutation
-            child_1, child_2 = reproduce(parent_1, parent_2)
-            next_generation.append(mutate(child_1, mute_rate))
-            next_generation.append(mutate(child_2, mute_rate))
+        # Checkpoint
+        done = state.stop or gen + 1 == num_gens
+        if checkpoint is not None and (done or
+                                       (gen + 1) % checkpoint_interval == 0):
+            checkpoint.save(population, gen + 1, rng)
+            timer.lap('checkpoint')
+        if state.stop:
+            break
 
-        # update population
-        population = next_generation
+    if population is not initial_population:
+        np.copyto(initial_population, population)
+    return initial_population
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def steady_state_genetic_algorithm(dataset, num_evals, pop_size, tourney_size,
+                                   mute_rate, fitness_fn=population_fitness,
+                                   executor='process', num_workers=None,
+                                   replacement='worst', batch_size=_batch_size,
+                                   seed=_seed, population=None, callbacks=(),
+                                   timer=None, genome_dtype=_genome_dtype,
+                                   rng=None, selection=None):
+    """ Asynchronous steady-state genetic algorithm, for expensive fitness
+
+    There is no generation barrier. A pool of workers continuously scores
+    offspring, each on its own batch. As soon as an offspring's score
+    arrives it replaces a member of the population, and a new offspring
+    is bred from the current population to take its place in the queue.
+    Twice as many offspring as workers are kept in flight, so workers
+    never wait on the main process, and a slow evaluation only holds up
+    its own worker: CPU use stays near 100% however widely evaluation
+    times vary.
+
+    Params
+    ------
+    num_evals : int
+        number of offspring to evaluate; num_gens * pop_size matches the
+        work of a generational run
+    fitness_fn : callable
+        batched fitness function (see Fitness functions); must be
+        picklable for the 'process' executor
+    executor : str
+        'process' or 'thread' pool of num_workers (default os.cpu_count())
+    replacement : str
+        'worst' : an offspring replaces the least fit member
+        'tournament' : an offspring replaces the least fit of
+            tourney_size random members (weaker selection pressure)
+    selection : callable
+        parent selection strategy (see selection_operator); tournaments
+        of tourney_size by default
+
+    Every pop_size evaluations count as a generation for callbacks.
+    Results arrive in an order that depends on timing, so unlike
+    genetic_algorithm, runs are not bit-reproducible from seed
+
+    Returns
+    -------
+    population : ndarray; (pop_size, D, K)
+        final population (evolved in-place if one was given)
+    """
+    if replacement not in ('worst', 'tournament'):
+        raise ValueError('unknown replacement {}'.format(replacement))
+    if executor not in ('process', 'thread'):
+        raise ValueError('unknown steady-state executor {}'.format(executor))
+
+    # Initialize genetic pool
+    # =======================
+    num_feat  = dataset.X.shape[-1]
+    num_class = len(dataset.target_names)
+    gene_size = (num_feat, num_class)
+    rng = make_rng(seed) if rng is None else rng
+    if population is None:
+        population = init_population(gene_size, pop_size, seed, genome_dtype,
+                                     rng)
+    num_workers = num_workers or os.cpu_count() or 1
+    queue_size = 2 * num_workers
+    offspring = np.empty((queue_size,) + population.shape[1:],
+                         population.dtype)
+
+    if timer is None:
+        timer = PhaseTimer()
+    state = GenerationState(timer)
+    state.population = population
+    batch_stats = batch_size if fitness_fn is population_fitness else None
+
+    pool_type = {'process': ProcessPoolExecutor,
+                 'thread': ThreadPoolExecutor}[executor]
+    with pool_type(num_workers) as pool:
+        # Initial population, scored in chunks
+        timer.start()
+        x, y = dataset.get_batch(batch_size)
+        chunk_size = -(-pop_size // (4 * num_workers))
+        tasks = [(fitness_fn, x, y, population[genomes])
+                 for genomes in _chunks(pop_size, chunk_size)]
+        scores = np.concatenate(list(pool.map(_score_chunk, tasks)))
+        scores = scores.astype(np.float64)
+        timer.lap('fitness')
+
+        pending = {} # future ---> offspring being scored
+        def breed(n):
+            evolve_generation(population, scores, tourney_size, mute_rate,
+                              out=offspring[:n], timer=timer, rng=rng,
+                              selection=selection)
+            for child in offspring[:n]:
+                x, y = dataset.get_batch(batch_size)
+                child = child[None].copy()
+                task = (fitness_fn, x, y, child)
+                pending[pool.submit(_score_chunk, task)] = child
+            timer.lap('dispatch')
+            return n
+
+        for callback in callbacks:
+            callback.on_generation_start(state)
+        submitted = breed(min(queue_size, num_evals))
+        evals = 0
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            timer.lap('waiting')
+
+            # Replacement
+            for future in done:
+                child = pending.pop(future)
+                if replacement == 'worst':
+                    i = np.argmin(scores)
+                else:
+                    entrants = rng.choice(pop_size, tourney_size,
+                                          replace=False)
+                    i = entrants[np.argmin(scores[entrants])]
+                population[i] = child[0]
+                scores[i] = future.result()[0]
+                evals += 1
+
+                # Generation boundary
+                if evals % pop_size == 0 and callbacks:
+                    state.gen = evals // pop_size - 1
+                    state.scores = scores
+                    state.stats = fitness_stats(population, scores,
+                                                batch_stats)
+                    for callback in callbacks:
+                        callback.on_generation_end(state)
+                    state.gen += 1
+                    state.scores = state.stats = None
+                    if not state.stop:
+                        for callback in callbacks:
+                            callback.on_generation_start(state)
+            timer.lap('replacement')
+
+            # Refill the queue
+            if state.stop:
+                for future in pending:
+                    future.cancel()
+                break
+            n = min(len(done), num_evals - submitted)
+            if n:
+                submitted += breed(n)
     return population
 
-def evaluate_population(dataset, population, test=False):
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def _chunks(size, chunk_size):
+    """ slices covering range(size) in blocks of chunk_size """
+    for start in range(0, size, chunk_size):
+        yield slice(start, min(start + chunk_size, size))
+
+
+def population_votes(X, population, weights=None,
+                     sample_chunk=_sample_chunk, genome_chunk=_genome_chunk):
+    """ Tally every genome's class predictions on X
+
+    Predictions are made in (genome_chunk, sample_chunk) blocks of
+    batched matmuls and accumulated directly into the vote tally,
+    so the (G, N) matrix of per-genome predictions is never built.
+    X is only ever read a sample_chunk at a time, so it may be a
+    memory-mapped array larger than memory.
+
+    Params
+    ------
+    X : ndarray; (N, D)
+        input features (eg, np.load(..., mmap_mode='r'))
+    population : ndarray; (G, D, K)
+        population of genomes
+    weights : ndarray; (G,)
+        optional vote weight of each genome; one vote each by default
+
+    Returns
+    -------
+    votes : ndarray.float64; (N, K)
+        votes[i, k] == total weight of genomes predicting class k for X[i]
+    """
+    G, D, K = population.shape
+    N = len(X)
+    if weights is not None:
+        weights = np.asarray(weights, np.float64)
+
+    votes = np.zeros((N, K))
+    for samples in _chunks(N, sample_chunk):
+        x = np.asarray(X[samples], np.float32)
+        n = len(x)
+        tally = votes[samples].reshape(-1) # (n*K,) view
+        offset = K * np.arange(n)          # flat index of (i, 0)
+        for genomes in _chunks(G, genome_chunk):
+            h = population_logits(x, population[genomes]) # (g, n, K)
+            yhat = np.argmax(h, axis=-1)          # (g, n)
+            w = None
+            if weights is not None:
+                w = np.repeat(weights[genomes], n)
+            tally += np.bincount((yhat + offset).ravel(), weights=w,
+                                 minlength=n * K)
+    return votes
+
+
+def population_predict(X, population, weights=None, **kwargs):
+    """ population's class predictions on X, as the (weighted) mode
+    of each genome's prediction; ties go to the lowest class
+    """
+    votes = population_votes(X, population, weights, **kwargs)
+    return np.argmax(votes, axis=-1)
+
+
+def evaluate_population(dataset, population, test=False, weighted=False):
     """ evaluate population's fitness against a non-training dataset
     Each genome in the population makes a "prediction" on a testing sample.
     The overall population prediction is computed as the mode of the
     genes' predictions.
+
+    If weighted, each genome's vote is instead weighted by its
+    fitness (accuracy) on the training set
     """
     # Get correct data set
     if test:
-        X = np.copy(dataset.x_test)
-        Y = np.copy(dataset.y_test)
+        X, Y = dataset.x_test, dataset.y_test
     else:
-        X = np.copy(dataset.x_validation)
-        Y = np.copy(dataset.y_validation)
+        X, Y = dataset.x_validation, dataset.y_validation
 
-    # Predict class labels
-    G = len(population)
-    N = len(Y)
-    Y_hat_genes = np.zeros((G, N), np.int32) # Y_hat[i,j] == gene[i] pred on Y[j]
+    # Vote weights
+    weights = None
+    if weighted:
+        x_train, y_train = dataset.x_train, dataset.y_train
+        weights = np.zeros(len(population))
+        for samples in _chunks(len(y_train), _sample_chunk):
+            x = np.asarray(x_train[samples], np.float32)
+            weights += population_fitness(x, y_train[samples], population)
 
-    for i, genome in enumerate(population):
-        Y_hat_genes[i] = predict(np.copy(X), genome)
+    # Predict class labels
+    Y_hat_pop = population_predict(X, population, weights)
 
     # Summarize fitness
-    Y_hat_pop = stats.mode(Y_hat_genes, axis=0)[0]
     pop_fitness = np.sum(Y_hat_pop == Y) / Y.size
     test_type = 'TEST' if test else 'VALIDATION'
     print(f'GA fitness, {test_type} accuracy: {pop_fitness:.4f}')
     return Y_hat_pop
 
 
+#-----------------------------------------------------------------------------#
+#                                  Inference                                  #
+#-----------------------------------------------------------------------------#
+
+class PopulationModel:
+    """ An evolved population compiled for serving predictions
+
+    The P genomes of shape (D, K) are concatenated into a single
+    (D, P*K) weight matrix, so scoring a batch is one GEMM, followed
+    by an argmax over each genome's K classes and a vote
+
+    Attributes
+    ----------
+    W : ndarray; (D, P*K)
+        stacked genomes; W[:, p*K:(p+1)*K] == population[p]
+    num_genomes : int
+        P, the number of genomes voting
+    num_classes : int
+        K, the number of classes
+    """
+    def __init__(self, W, num_classes):
+        assert W.ndim == 2 and W.shape[-1] % num_classes == 0
+        self.W = W
+        self.num_classes = num_classes
+        self.num_genomes = W.shape[-1] // num_classes
+
+    @classmethod
+    def from_population(cls, population):
+        """ compile a (P, D, K) population, in any genome dtype """
+        P, D, K = population.shape
+        W = np.ascontiguousarray(dequantize(population).transpose(1, 0, 2))
+        return cls(W.reshape(D, P * K), K)
+
+    def votes(self, X):
+        """ number of genomes voting for each class, (N, K) """
+        K = self.num_classes
+        N = len(X)
+        votes = np.zeros((N, K), np.int64)
+        for samples in _chunks(N, _sample_chunk):
+            h = np.matmul(X[samples], self.W)           # (n, P*K)
+            n = len(h)
+            yhat = np.argmax(h.reshape(n, -1, K), axis=-1) # (n, P)
+            yhat += K * np.arange(n)[:, None]
+            votes[samples] = np.bincount(yhat.ravel(),
+                                         minlength=n * K).reshape(n, K)
+        return votes
+
+    def predict(self, X):
+        """ predicted class labels for X, (N,) """
+        return np.argmax(self.votes(X), axis=-1)
+
+    def predict_proba(self, X):
+        """ fraction of genomes voting for each class, (N, K) """
+        return self.votes(X) / self.num_genomes
+
+    def save(self, path):
+        """ save as a (D, P, K) .npy array """
+        D = self.W.shape[0]
+        np.save(path, self.W.reshape(D, self.num_genomes, self.num_classes))
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        W = np.load(path, mmap_mode=mmap_mode)
+        D, P, K = W.shape
+        return cls(W.reshape(D, P * K), K)
+
+
+#-----------------------------------------------------------------------------#
+#                                Island model                                 #
+#-----------------------------------------------------------------------------#
+""" Parallel GA over sub-populations ("islands")
+
+Each island evolves independently in its own process for a number of
+generations, after which the fittest genomes of each island migrate to
+its neighbours (per the topology), replacing their least fit genomes.
+
+All island populations live in one (I, P, D, K) shared memory block, and
+the dataset splits are shared read-only, so nothing but a few scalars and
+the per-island scores are ever pickled between processes.
+"""
+
+class SharedArray:
+    """ ndarray backed by multiprocessing.shared_memory
+
+    Pickles by reference (the shared memory block name), so passing
+    a SharedArray to a worker process attaches to the same memory
+    instead of copying the data
+    """
+    def __init__(self, shape, dtype, name=None, readonly=False):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.readonly = readonly
+        size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+        self.shm = shared_memory.SharedMemory(name, create=name is None,
+                                              size=size)
+        self.array = np.ndarray(self.shape, self.dtype, buffer=self.shm.buf)
+        if readonly and name is not None:
+            self.array.flags.writeable = False
+
+    @classmethod
+    def copy_of(cls, arr, readonly=False):
+        shared = cls(arr.shape, arr.dtype, readonly=readonly)
+        shared.array[...] = arr
+        return shared
+
+    def __reduce__(self):
+        args = (self.shape, self.dtype.str, self.shm.name, self.readonly)
+        return (self.__class__, args)
+
+    def release(self):
+        """ close and free the shared memory (owning process only) """
+        del self.array
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SharedDataset:
+    """ Read-only split dataset, in shared memory
+
+    Every split (x_train, y_train, x_validation, ...) is one SharedArray,
+    and the dataset pickles by reference to them, so it can stand in for
+    the dataset inside worker processes without copying the data.
+    Provides the attributes that genetic_algorithm and
+    evaluate_population use (X, target_names, get_batch and the splits).
+    Batches are drawn from rng, which workers set to their own stream
+    """
+    splits = ('x_train', 'y_train', 'x_validation', 'y_validation',
+              'x_test', 'y_test')
+
+    def __init__(self, dataset, rng=None):
+        self._shared = {name: SharedArray.copy_of(
+                            np.asarray(getattr(dataset, name)), readonly=True)
+                        for name in self.splits}
+        self.target_names = list(dataset.target_names)
+        self.rng = rng
+        self._attach()
+
+    def _attach(self):
+        for name, shared in self._shared.items():
+            setattr(self, name, shared.array)
+
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k not in self.splits}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._attach()
+
+    @property
+    def X(self):
+        return self.x_train
+
+    @property
+    def Y(self):
+        return self.y_train
+
+    def get_batch(self, batch_size):
+        idx = get_rng(self.rng).integers(0, len(self.Y), batch_size)
+        return self.X[idx], self.Y[idx]
+
+    def release(self):
+        for name in self.splits:
+            delattr(self, name)
+        for shared in self._shared.values():
+            shared.release()
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def migrate(populations, scores, num_migrants=_num_migrants,
+            topology=_topology):
+    """ Move the fittest genomes of each island to other islands
+
+    Emigrants replace the least fit genomes of the receiving island.
+    All emigrants are copied out before any island is modified, so
+    migration is simultaneous.
+
+    Params
+    ------
+    populations : ndarray; (I, P, D, K)
+        island populations, modified in-place
+    scores : ndarray; (I, P)
+        fitness of each genome on each island
+    num_migrants : int
+        number of genomes each island sends to each destination
+    topology : str
+        'ring' : island i sends to island i + 1
+        'full' : every island sends to every other island
+    """
+    I, P = scores.shape
+    if topology not in ('ring', 'full'):
+        raise ValueError('unknown migration topology {}'.format(topology))
+    num_sources = 1 if topology == 'ring' else I - 1
+    assert num_sources * num_migrants < P
+
+    ranked = np.argsort(-scores, axis=1) # fittest first
+    emigrants = populations[np.arange(I)[:, None], ranked[:, :num_migrants]]
+
+    for i in range(I):
+        if topology == 'ring':
+            sources = [(i - 1) % I]
+        else:
+            sources = [j for j in range(I) if j != i]
+        immigrants = emigrants[sources].reshape((-1,) + populations.shape[2:])
+        least_fit = ranked[i, P - len(immigrants):]
+        populations[i, least_fit] = immigrants
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+_island = {} # per-worker state, set by _init_island_worker
+
+def _init_island_worker(dataset, populations):
+    """ attach worker process to the shared dataset and populations """
+    _island['dataset'] = dataset
+    _island['populations'] = populations
+
+def _evolve_island(args):
+    """ evolve one island in-place
+
+    The island's Generator travels with the task and is returned with
+    its advanced state, so each island's stream is continuous no matter
+    which worker process runs it
+
+    Returns
+    -------
+    scores : ndarray; (P,)
+        island fitness, for migration
+    rng : np.random.Generator
+        island's random stream
+    """
+    (i, num_gens, tourney_size, mute_rate, batch_size, rng,
+     selection, sharing) = args
+    dataset = _island['dataset']
+    dataset.rng = rng
+    population = _island['populations'].array[i]
+
+    genetic_algorithm(dataset, num_gens, len(population), tourney_size,
+                      mute_rate, batch_size, population=population, rng=rng,
+                      selection=selection, sharing=sharing)
+    x, y = dataset.get_batch(batch_size)
+    return population_fitness(x, y, population), rng
+
+
+def island_genetic_algorithm(dataset, num_gens, pop_size, tourney_size,
+                             mute_rate, num_islands=4,
+                             migration_interval=_migration_interval,
+                             num_migrants=_num_migrants, topology=_topology,
+                             batch_size=_batch_size, seed=_seed,
+                             genome_dtype=_genome_dtype,
+                             bit_generator=_bit_generator, selection=None,
+                             sharing=None):
+    """ Island-model genetic algorithm
+
+    num_islands populations of pop_size genomes each evolve in a pool
+    of worker processes, migrating every migration_interval generations
+
+    Each island has its own random stream, spawned from seed, so runs
+    are reproducible
+
+    Returns
+    -------
+    population : ndarray; (num_islands * pop_size, D, K)
+        all islands' genomes, merged into a single population
+    """
+    num_feat  = dataset.X.shape[-1]
+    num_class = len(dataset.target_names)
+    gene_size = (num_feat, num_class)
+
+    # Shared state
+    # ============
+    shared_data = SharedDataset(dataset)
+    populations = SharedArray((num_islands, pop_size) + gene_size,
+                              genome_dtype)
+    rngs = spawn_rngs(seed, num_islands, bit_generator)
+    try:
+        for i, rng in enumerate(rngs):
+            populations.array[i] = init_population(gene_size, pop_size,
+                                    dtype=genome_dtype, rng=rng)
+
+        # Evolve islands
+        # ==============
+        with Pool(num_islands, _init_island_worker,
+                  (shared_data, populations)) as pool:
+            for start in range(0, num_gens, migration_interval):
+                gens = min(migration_interval, num_gens - start)
+                tasks = [(i, gens, tourney_size, mute_rate, batch_size, rng,
+                          selection, sharing) for i, rng in enumerate(rngs)]
+                scores, rngs = zip(*pool.map(_evolve_island, tasks))
+                scores = np.stack(scores)
+                if start + gens < num_gens:
+                    migrate(populations.array, scores, num_migrants, topology)
+
+        population = populations.array.reshape((-1,) + gene_size).copy()
+    finally:
+        populations.release()
+        shared_data.release()
+    return population
+
+
 def main():
     # parse args
     # ==========
     args = cli.parse_args()
+    if args.islands > 1 and (args.checkpoint is not None or
+                             args.checkpoint_interval is not None):
+        cli.error('checkpoints are not supported with --islands > 1')
+    checkpoint_interval = args.checkpoint_interval
+    if checkpoint_interval is None:
+        checkpoint_interval = _checkpoint_interval
 
     # sess
     seed  = args.rng_seed
     dname = args.dataset
     num_test = args.num_test
 
+    # datasets split and batch with the legacy global RNG
+    np.random.seed(seed)
+
     # dataset init
+    if dname not in datasets:
+        raise FileNotFoundError('dataset stuff was removed from this project, just use sklearn')
     dataset = datasets[dname]()
     dataset.split_dataset(num_test=num_test)
 
@@ -303,18 +2254,47 @@ def main():
     tournament_size = args.tournament_size
     mutation_rate   = args.mutation_rate
     num_generations = args.num_generations
+    num_islands = args.islands
+    selection = None
+    if args.selection != 'tournament':
+        selection = selection_operator(args.selection)
+    sharing = None
+    if args.share_sigma is not None:
+        sharing = FitnessSharing(args.share_sigma,
+                                 sample_size=args.share_sample)
 
     # Run GA
     # ======
-    population = genetic_algorithm(dataset, num_generations, population_size,
-                                   tournament_size, mutation_rate, seed=seed)
+    if num_islands > 1:
+        population = island_genetic_algorithm(dataset, num_generations,
+                        population_size, tournament_size, mutation_rate,
+                        num_islands=num_islands,
+                        migration_interval=args.migration_interval, seed=seed,
+                        genome_dtype=args.genome_dtype,
+                        bit_generator=args.bit_generator, selection=selection,
+                        sharing=sharing)
+    else:
+        checkpoint = None
+        if args.checkpoint is not None:
+            gene_size = (dataset.X.shape[-1], len(dataset.target_names))
+            checkpoint = Checkpoint.open(args.checkpoint,
+                                         (population_size,) + gene_size,
+                                         args.genome_dtype, args.bit_generator)
+        population = genetic_algorithm(dataset, num_generations,
+                        population_size, tournament_size, mutation_rate,
+                        seed=seed, checkpoint=checkpoint,
+                        checkpoint_interval=checkpoint_interval,
+                        genome_dtype=args.genome_dtype,
+                        rng=make_rng(seed, args.bit_generator),
+                        selection=selection, sharing=sharing)
     preds = evaluate_population(dataset, population, test=True)
 
     return 0
 
 if __name__ == '__main__':
+    ret = 1
     try:
         ret = main()
-    except:
+    except Exception:
         traceback.print_exc()
     sys.exit(ret)
@@ -0,0 +1,359 @@
+""" Multi-objective genetic algorithm (NSGA-II)
+
+# Population evolution
+#---------------------
+Genomes are scored on several objectives at once, eg. accuracy against
+the L1 norm of their genes, and the population evolves towards the
+Pareto front of the trade-off rather than a single fittest genome:
+
+- Population of genomes is initialized, as in genetic_algorithm
+
+- Each generation:
+
+  * Rank(Population)        # non-dominated sort + crowding distance
+  * Offspring(Population)   # crowded tournaments, crossover, mutation
+  * Fitness(all)            # every objective of parents and offspring
+  * Survival(all)           # best P of parents + offspring, by front,
+                            # then by crowding distance within a front
+
+Genome i dominates genome j when it is at least as good on every
+objective and better on one. Front 0 is the non-dominated genomes,
+front 1 those only dominated by front 0, and so on. Crowding distance
+favours genomes in sparse regions of their front, keeping the front
+spread out.
+
+Ranking is vectorized: the (P, P) domination matrix is built with one
+broadcast comparison per objective, fronts are peeled with matrix
+reductions (one step per front), and crowding distances for all fronts
+come from one sort per objective. Breeding reuses the GA's vectorized
+operators (evolve_generation) as is, since the crowded comparison is a
+total order of the population
+
+Usage
+-----
+$ python nsga2.py -g 200 -p 256 -o accuracy l1
+"""
+import sys
+import argparse
+
+import numpy as np
+
+import genetic_algorithm as ga
+
+
+#-----------------------------------------------------------------------------#
+#                                   Config                                    #
+#-----------------------------------------------------------------------------#
+
+_seed = ga._seed
+_batch_size = 32        # objectives are compared directly, not in tournaments
+_population_size = 256
+_tournament_size = 2    # binary crowded tournaments
+_mutation_rate = ga._mutation_rate
+_num_generations = ga._num_generations
+_objectives = ('accuracy', 'l1')
+_sparsity_tol = 0.05    # genes below this fraction of the init bound are 0
+
+
+#-----------------------------------------------------------------------------#
+#                                  Objectives                                 #
+#-----------------------------------------------------------------------------#
+""" All objectives are maximized, so penalties are negated
+
+    accuracy : fraction of the batch classified correctly
+    l1       : - mean |gene|, the convex proxy for sparsity
+    l2       : - mean gene^2, weight magnitude
+    sparsity : fraction of genes within _sparsity_tol of 0
+"""
+
+def _genes(population):
+    return ga.dequantize(population).reshape(len(population), -1)
+
+def _l1(x, y, population):
+    return -np.abs(_genes(population)).mean(axis=1)
+
+def _l2(x, y, population):
+    genes = _genes(population)
+    return -np.einsum('ij,ij->i', genes, genes) / genes.shape[1]
+
+def _sparsity(x, y, population):
+    bound = np.sqrt(6 / sum(population.shape[1:])) # glorot_uniform bound
+    return (np.abs(_genes(population)) < _sparsity_tol * bound).mean(axis=1)
+
+def _accuracy(x, y, population):
+    return ga.population_fitness(x, y, population) / len(y)
+
+OBJECTIVES = {'accuracy': _accuracy, 'l1': _l1, 'l2': _l2,
+              'sparsity': _sparsity}
+
+
+def evaluate_objectives(x, y, population, objectives=_objectives, out=None):
+    """ objective matrix of population; objectives are names in
+    OBJECTIVES or batched fitness functions
+
+    Returns
+    -------
+    F : ndarray.float64; (P, M)
+        F[i, m] == objective m of genome i, higher is better
+    """
+    if out is None:
+        out = np.empty((len(population), len(objectives)))
+    for m, objective in enumerate(objectives):
+        fn = OBJECTIVES[objective] if isinstance(objective, str) else objective
+        out[:, m] = fn(x, y, population)
+    return out
+
+
+#-----------------------------------------------------------------------------#
+#                                   Ranking                                   #
+#-----------------------------------------------------------------------------#
+
+def domination_matrix(F):
+    """ dominates[i, j] == genome i dominates genome j
+
+    One broadcast (P, P) comparison per objective
+    """
+    P, M = F.shape
+    no_worse = np.ones((P, P), bool)
+    better = np.zeros((P, P), bool)
+    for m in range(M):
+        f = F[:, m]
+        no_worse &= f[:, None] >= f
+        better |= f[:, None] > f
+    no_worse &= better
+    return no_worse
+
+
+def non_dominated_sort(F):
+    """ Pareto front of every genome
+
+    Fronts are peeled off one at a time: genomes that no remaining
+    genome dominates form the next front, and are then removed from the
+    domination counts with one reduction over the domination matrix.
+    The only python loop is over fronts
+
+    Returns
+    -------
+    ranks : ndarray.int64; (P,)
+        front of each genome; 0 is the non-dominated front
+    """
+    dominates = domination_matrix(F)
+    num_dominators = dominates.sum(axis=0)
+    ranks = np.full(len(F), -1, np.int64)
+    front = num_dominators == 0
+    rank = 0
+    while front.any():
+        ranks[front] = rank
+        num_dominators -= dominates[front].sum(axis=0)
+        num_dominators[front] = -1 # retired
+        front = num_dominators == 0
+        rank += 1
+    return ranks
+
+
+def crowding_distance(F, ranks):
+    """ Crowding distance of every genome within its front
+
+    For each objective, all genomes are sorted by (front, objective)
+    at once; a genome's distance is the gap between its neighbours in
+    its front, over the front's range, summed over objectives. The
+    extremes of every front get inf, so they are always kept
+
+    Returns
+    -------
+    distance : ndarray.float64; (P,)
+    """
+    P, M = F.shape
+    distance = np.zeros(P)
+    for m in range(M):
+        order = np.lexsort((F[:, m], ranks))
+        f = F[order, m]
+        r = ranks[order]
+        edge = np.r_[True, r[1:] != r[:-1]] # first of each front
+        starts = np.flatnonzero(edge)
+        edge |= np.r_[r[1:] != r[:-1], True] # ... and last
+        span = np.maximum.reduceat(f, starts) - np.minimum.reduceat(f, starts)
+        span = np.repeat(span, np.diff(np.r_[starts, P]))
+
+        gap = np.empty(P)
+        gap[1:-1] = f[2:] - f[:-2]
+        gap[edge] = np.inf
+        with np.errstate(divide='ignore', invalid='ignore'):
+            d = gap / span
+        d[np.isnan(d)] = 0 # single-valued front
+        distance[order] += d
+    return distance
+
+
+def crowded_order(F):
+    """ Population indices, best first by the crowded comparison:
+    lower front first, then larger crowding distance
+
+    Returns
+    -------
+    order : ndarray.int64; (P,)
+    ranks : ndarray.int64; (P,)
+        front of each genome
+    """
+    ranks = non_dominated_sort(F)
+    distance = crowding_distance(F, ranks)
+    return np.lexsort((-distance, ranks)), ranks
+
+
+#-----------------------------------------------------------------------------#
+#                                   NSGA-II                                   #
+#-----------------------------------------------------------------------------#
+
+def nsga2(dataset, num_gens, pop_size, tourney_size=_tournament_size,
+          mute_rate=_mutation_rate, objectives=_objectives,
+          batch_size=_batch_size, seed=_seed, population=None, callbacks=(),
+          timer=None, genome_dtype=ga._genome_dtype, rng=None):
+    """ NSGA-II on the GA's genomes and operators
+
+    returns the population evolved on dataset over num_gens, sorted by
+    the crowded comparison, with its objectives
+
+    Parents and offspring share one (2P, D, K) buffer: offspring are bred
+    into the second half with evolve_generation, using tournaments over
+    the crowded order, every genome is scored on the generation's
+    batch, and the best P are moved to the first half
+
+    Callbacks get the usual GenerationState, with the first objective
+    as scores, plus `objectives` (P, M) and `ranks` (P,) attributes
+
+    Returns
+    -------
+    population : ndarray; (P, D, K)
+        final population, best first; population[ranks == 0] is the
+        Pareto front
+    F : ndarray.float64; (P, M)
+        objectives of population, on the last batch
+    ranks : ndarray.int64; (P,)
+        front of each genome
+    """
+    # Initialize genetic pool
+    # =======================
+    num_feat  = dataset.X.shape[-1]
+    num_class = len(dataset.target_names)
+    gene_size = (num_feat, num_class)
+    rng = ga.make_rng(seed) if rng is None else rng
+    if population is None:
+        population = ga.init_population(gene_size, pop_size, seed,
+                                        genome_dtype, rng)
+    initial_population = population
+
+    # parents in pool[:P], offspring in pool[P:]
+    pool = np.empty((2 * pop_size,) + gene_size, population.dtype)
+    pool[:pop_size] = population
+    population, offspring = pool[:pop_size], pool[pop_size:]
+    F_pool = np.empty((2 * pop_size, len(objectives)))
+
+    if timer is None:
+        timer = ga.PhaseTimer()
+    state = ga.GenerationState(timer)
+
+    # Rank initial population
+    x, y = dataset.get_batch(batch_size)
+    evaluate_objectives(x, y, population, objectives, out=F_pool[:pop_size])
+    order, ranks = crowded_order(F_pool[:pop_size])
+
+    for gen in range(num_gens):
+        state.gen = gen
+        state.population = population
+        state.scores = state.stats = None
+        for callback in callbacks:
+            callback.on_generation_start(state)
+        timer.start()
+
+        # Breed offspring by crowded tournaments
+        scores = np.empty(pop_size)
+        scores[order] = -np.arange(pop_size) # best first ---> highest score
+        ga.evolve_generation(population, scores, tourney_size, mute_rate,
+                             out=offspring, timer=timer, rng=rng)
+
+        # Score parents and offspring on a new batch
+        x, y = dataset.get_batch(batch_size)
+        timer.lap('batch')
+        evaluate_objectives(x, y, pool, objectives, out=F_pool)
+        timer.lap('fitness')
+
+        # Survival of the best P
+        order, ranks = crowded_order(F_pool)
+        survivors = order[:pop_size]
+        population[...] = pool[survivors]
+        F_pool[:pop_size] = F_pool[survivors]
+        ranks = ranks[survivors]
+        order = np.arange(pop_size) # survivors are already sorted
+        timer.lap('sorting')
+
+        if callbacks:
+            state.scores = F_pool[:pop_size, 0]
+            state.objectives = F_pool[:pop_size]
+            state.ranks = ranks
+            state.stats = ga.fitness_stats(population, state.scores)
+        for callback in callbacks:
+            callback.on_generation_end(state)
+        if state.stop:
+            break
+
+    np.copyto(initial_population, population)
+    return initial_population, F_pool[:pop_size].copy(), ranks
+
+
+#-----------------------------------------------------------------------------#
+#                                     CLI                                     #
+#-----------------------------------------------------------------------------#
+
+cli = argparse.ArgumentParser(description=__doc__,
+                              formatter_class=argparse.RawTextHelpFormatter)
+cli.add_argument('-d', '--dataset', type=str, default=ga._dname,
+    choices=list(ga.datasets.keys()) or None, help='dataset for model')
+cli.add_argument('-p', '--population_size', type=int, default=_population_size,
+    metavar='P', help='number of genomes in population')
+cli.add_argument('-t', '--tournament_size', type=int, default=_tournament_size,
+    metavar='T', help='number of genomes per crowded tournament')
+cli.add_argument('-m', '--mutation_rate', type=float, default=_mutation_rate,
+    metavar='M', help='probability any gene of an offspring is resampled')
+cli.add_argument('-g', '--num_generations', type=int, default=_num_generations,
+    metavar='G', help='number of generations')
+cli.add_argument('-o', '--objectives', type=str, nargs='+',
+    default=list(_objectives), choices=list(OBJECTIVES.keys()),
+    help='objectives to maximize')
+cli.add_argument('-b', '--batch_size', type=int, default=_batch_size)
+cli.add_argument('-r', '--rng_seed', type=int, default=_seed, metavar='R')
+cli.add_argument('-n', '--num_test', type=int, default=ga._num_test,
+    metavar='N', help='number of samples held out for validation and test')
+
+
+def main():
+    args = cli.parse_args()
+    seed = args.rng_seed
+
+    # datasets split and batch with the legacy global RNG
+    np.random.seed(seed)
+    if args.dataset not in ga.datasets:
+        raise FileNotFoundError('dataset stuff was removed from this project, just use sklearn')
+    dataset = ga.datasets[args.dataset]()
+    dataset.split_dataset(num_test=args.num_test)
+
+    population, F, ranks = nsga2(dataset, args.num_generations,
+                                 args.population_size, args.tournament_size,
+                                 args.mutation_rate, args.objectives,
+                                 args.batch_size, seed)
+
+    # Pareto front, by first objective
+    front = np.flatnonzero(ranks == 0)
+    front = front[np.argsort(-F[front, 0], kind='stable')]
+    points = np.unique(F[front], axis=0)[::-1]
+    print('Pareto front: {} genomes, {} distinct points'.format(len(front),
+                                                              len(points)))
+    print('  ' + '  '.join('{:>10}'.format(o) for o in args.objectives))
+    for point in points:
+        print('  ' + '  '.join('{:>10.4f}'.format(f) for f in point))
+
+    # genome at the front's best first objective
+    ga.evaluate_population(dataset, population[front[:1]], test=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
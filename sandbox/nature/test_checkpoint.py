@@ -0,0 +1,87 @@
+""" Crash-and-resume tests for genetic_algorithm checkpoints
+
+$ python -m pytest test_checkpoint.py
+"""
+import numpy as np
+import pytest
+
+import genetic_algorithm as ga
+
+
+class BatchDataset:
+    """ small linearly separable dataset that draws its batches from the
+    legacy global RNG, like the project's datasets
+    """
+    def __init__(self, num_samples=256, num_feat=6, num_class=3, seed=0):
+        rng = np.random.RandomState(seed)
+        W = rng.randn(num_feat, num_class)
+        self.X = rng.randn(num_samples, num_feat).astype(np.float32)
+        self.Y = np.argmax(self.X @ W, axis=-1).astype(np.int32)
+        self.target_names = [str(k) for k in range(num_class)]
+
+    def get_batch(self, batch_size):
+        idx = np.random.randint(0, len(self.Y), batch_size)
+        return self.X[idx], self.Y[idx]
+
+
+class Crash(ga.Callback):
+    """ raises at the start of generation gen """
+    def __init__(self, gen):
+        self.gen = gen
+
+    def on_generation_start(self, state):
+        if state.gen == self.gen:
+            raise KeyboardInterrupt
+
+
+_shape = dict(pop_size=16, tourney_size=4, mute_rate=0.1)
+
+
+def run(dataset, num_gens, checkpoint=None, interval=10, callbacks=(),
+        bit_generator='pcg64'):
+    np.random.seed(7)
+    return ga.genetic_algorithm(dataset, num_gens, **_shape, seed=3,
+                                checkpoint=checkpoint,
+                                checkpoint_interval=interval,
+                                callbacks=callbacks,
+                                rng=ga.make_rng(3, bit_generator))
+
+
+@pytest.mark.parametrize('interval, crash_gen', [(10, 14), (3, 8), (4, 4)])
+@pytest.mark.parametrize('bit_generator', ['pcg64', 'philox'])
+def test_resume_after_crash(tmp_path, interval, crash_gen, bit_generator):
+    dataset = BatchDataset()
+    num_gens = 20
+    expected = run(dataset, num_gens, bit_generator=bit_generator)
+
+    shape = (_shape['pop_size'], 6, 3)
+    path = str(tmp_path / 'ckpt')
+    checkpoint = ga.Checkpoint.open(path, shape, bit_generator=bit_generator)
+    with pytest.raises(KeyboardInterrupt):
+        run(dataset, num_gens, checkpoint, interval, [Crash(crash_gen)],
+            bit_generator)
+
+    # resume in a "new process": stale RNG states, fresh checkpoint handle
+    np.random.seed(12345)
+    checkpoint = ga.Checkpoint.open(path, shape, bit_generator=bit_generator)
+    assert checkpoint.generation == crash_gen // interval * interval
+    rng = ga.make_rng(999, bit_generator)
+    resumed = ga.genetic_algorithm(dataset, num_gens, **_shape, seed=999,
+                                   checkpoint=checkpoint,
+                                   checkpoint_interval=interval, rng=rng)
+    np.testing.assert_array_equal(resumed, expected)
+
+
+def test_open_rejects_mismatched_checkpoint(tmp_path):
+    dataset = BatchDataset()
+    shape = (_shape['pop_size'], 6, 3)
+    path = str(tmp_path / 'ckpt')
+    run(dataset, 2, ga.Checkpoint.open(path, shape), interval=1)
+
+    assert ga.Checkpoint.open(path, shape).generation == 2
+    with pytest.raises(ValueError):
+        ga.Checkpoint.open(path, shape, dtype='float16')
+    with pytest.raises(ValueError):
+        ga.Checkpoint.open(path, shape, bit_generator='philox')
+    with pytest.raises(ValueError):
+        ga.Checkpoint.open(path, (8, 6, 3))
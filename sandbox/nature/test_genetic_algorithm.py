@@ -0,0 +1,42 @@
+""" Tests for the population operators of genetic_algorithm
+
+$ python -m pytest test_genetic_algorithm.py
+"""
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import genetic_algorithm as ga
+
+
+@pytest.mark.parametrize('mutation_rate', [0.001, 0.1, 0.5])
+def test_mutation_rate(mutation_rate):
+    population = np.zeros((1000, 20, 5), np.float32)
+    ga.mutate_population(population, mutation_rate, ga.make_rng(0))
+    rate = np.mean(population != 0)
+    assert abs(rate - mutation_rate) < 4 * np.sqrt(mutation_rate / 1e5) + 1e-4
+
+
+@pytest.mark.parametrize('genome_dtype', ['float32', 'int8'])
+def test_mutation_memory_is_bounded(genome_dtype):
+    population = ga.init_population((64, 10), 20000, dtype=genome_dtype,
+                                    rng=ga.make_rng(0))
+    tracemalloc.start()
+    try:
+        ga.mutate_population(population, 0.1, ga.make_rng(1))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # per block: int64 gaps and sites, float32 genes and their stored copy
+    assert peak < 32 * ga._mutation_chunk
+    assert peak < population.nbytes
+
+
+def test_diversity_is_in_gene_units():
+    population = ga.init_population((64, 10), 500, rng=ga.make_rng(0))
+    expected = population.std(axis=0).mean()
+    for genome_dtype in ['float32', 'float16', 'int8']:
+        stored = ga.quantize(population, (64, 10), genome_dtype)
+        diversity = ga.population_diversity(stored)
+        np.testing.assert_allclose(diversity, expected, rtol=1e-3)